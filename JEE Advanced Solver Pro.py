@@ -1,11 +1,14 @@
 import streamlit as st
-import google.generativeai as genai
-from langgraph.graph import StateGraph
-from typing import TypedDict
-import time
-import random
 import asyncio
-from mistralai import Mistral
+import time
+from pipeline import get_document_store, DEFAULT_SOLVER_WORKERS, DEFAULT_TOP_K
+from planner import DEFAULT_PROMPT_TOKEN_BUDGET
+from jobs import get_job_manager, JOB_QUEUED, JOB_DONE, JOB_FAILED
+
+# Seconds between refreshes while a job is queued or running
+POLL_SECONDS = 2
+# Pages of extracted text rendered at a time, so a large book is never sent to the browser in full
+PAGES_PER_VIEW = 5
 
 # Ensure asyncio event loop compatibility
 try:
@@ -13,228 +16,8 @@ try:
 except RuntimeError:
     asyncio.set_event_loop(asyncio.new_event_loop())
 
-# Define State Schema
-class GraphState(TypedDict):
-    api_key: str
-    questions_text: str
-    context_text: str
-    generated_answers: dict
-
-# Function to upload PDF to Mistral OCR and get signed URL
-def upload_pdf_to_mistral(uploaded_file, api_key):
-    client = Mistral(api_key=api_key)
-    with st.spinner(f"Uploading {uploaded_file.name} to Mistral OCR..."):
-        try:
-            uploaded_pdf = client.files.upload(
-                file={
-                    "file_name": uploaded_file.name,
-                    "content": uploaded_file.getvalue(),
-                },
-                purpose="ocr"
-            )
-            file_id = uploaded_pdf.id
-            if not file_id:
-                return None, "Error: Failed to get file_id from Mistral OCR response."
-            
-            signed_url = client.files.get_signed_url(file_id=file_id)
-            return signed_url.url, None
-        except Exception as e:
-            return None, f"Error uploading PDF: {e}"
-
-# Function to extract text from PDFs using Mistral OCR
-def extract_text_from_pdf_mistral(document_url, api_key):
-    if not document_url:
-        return "Error: No valid document URL provided."
-    
-    client = Mistral(api_key=api_key)
-    with st.spinner("Extracting text from PDF using Mistral OCR..."):
-        try:
-            ocr_response = client.ocr.process(
-                model="mistral-ocr-latest",
-                document={"type": "document_url", "document_url": document_url},
-                include_image_base64=False
-            )
-            pages = ocr_response.pages if hasattr(ocr_response, "pages") else []
-            extracted_text = "\n\n".join(page.markdown for page in pages)
-            return extracted_text if extracted_text else "No text found."
-        except Exception as e:
-            return f"Error extracting text: {e}"
-
-# LangGraph setup
-graph = StateGraph(GraphState)
-
-def call_gemini_with_retry(prompt, api_key, max_retries=3):
-    """Retries Gemini API calls if resource is exhausted."""
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(prompt)
-            return response.text if hasattr(response, "text") else ""
-        except Exception as e:
-            if "ResourceExhausted" in str(e):
-                wait_time = 2 ** attempt + random.uniform(0, 1)
-                time.sleep(wait_time)
-            else:
-                return f"Error: {str(e)}"
-    return "Error: API quota exceeded. Please try again later."
-
-# Function to analyze context relevance to questions
-def analyze_context_relevance(state: GraphState) -> GraphState:
-    """Pre-analyzes context material to identify relevant information for each question."""
-    if not state["context_text"] or "Error:" in state["context_text"] or "No text found" in state["context_text"]:
-        state["relevance_analysis"] = {}
-        return state
-    
-    prompt = """
-    You are an expert at analyzing educational materials for JEE Advanced. Your task is to identify what information in the context,concepts material is relevant to each of the questions.
-    
-    CONTEXT MATERIAL:
-    {}
-    
-    QUESTIONS TEXT:
-    {}
-    
-    For each question you identify in the QUESTIONS TEXT:
-    1. Extract the question number and core topic/concept of the question
-    2. Search the context material for ANY of the following that could be relevant:
-       - Similar solved examples or problems
-       - Explanations of the mathematical/scientific concepts involved
-       - Formulas, theorems, or principles that apply to this question
-       - Methods or techniques mentioned that could help solve this type of problem
-       - Any diagrams, figures, or illustrations related to the topic
-    
-    Provide your analysis in this format:
-    
-    Question [X]: [Core topic/concept]
-    Relevant Information:
-    - [Specific relevant information found in context material and explained step by step]
-    - [Another piece of relevant information and explained step by step]
-    Connection: [Explain how this information helps solve the question step by step]
-    
-    Note: Consider even indirect connections where concepts or techniques might be adapted from one scenario to another which will help to solve the question.
-    """.format(state["context_text"], state["questions_text"])
-    
-    relevance_analysis = call_gemini_with_retry(prompt, state["api_key"])
-    
-    state["relevance_analysis"] = relevance_analysis
-    return state
-
-# Agent: Solve Questions with Context
-def solve_questions(state: GraphState) -> GraphState:
-    # Determine if context is available
-    has_context = state["context_text"] and "Error:" not in state["context_text"] and "No text found" not in state["context_text"]
-    
-    # Get pre-analyzed context relevance if it exists
-    relevance_info = state.get("relevance_analysis", "")
-    
-    if has_context:
-        prompt = """
-        You are an expert at solving JEE Advanced level problems. Your task is to extract questions from the questions PDF, identify relevant information from the context PDF, and provide detailed solutions.
-        followings that could be relevant information:
-       - Similar solved examples or problems
-       - Explanations of the mathematical/scientific concepts involved
-       - Formulas, theorems, or principles that apply to this question
-       - Methods or techniques mentioned that could help solve this type of problem
-       - Any diagrams, figures, or illustrations related to the topic
-       - Consider even indirect connections where concepts or techniques might be adapted from one scenario to another which will help to solve the question
-
-        CONTEXT MATERIAL:
-        {}
-        
-        QUESTIONS TEXT:
-        {}
-        
-        RELEVANCE ANALYSIS:
-        {}
-        
-        FORMAT INSTRUCTIONS:
-        For each question you identify in the QUESTIONS TEXT:
-        
-        1. First, extract and present the EXACT question as it appears in the original text, preserving all mathematical notation, question numbers, and formatting.
-           Format: "**Question X:** [exact question text as it appears in the PDF]" (replace X with the actual question number)
-        
-        2. MANDATORY: Provide a detailed analysis of how the context material helps with this question:
-           Format: "**Context Analysis:**"
-           - If you found DIRECTLY relevant information (like a similar solved problem), explain: "The context PDF contains a directly relevant example/explanation about [specific concept] which shows how to [approach/technique] and explain how it is relevant step by step."
-           - If you found INDIRECTLY relevant information (like related concepts that can be adapted), explain: "The context PDF discusses [related concept/principle] which can be adapted to this problem because [explanation of connection]. and explain step by step how it can be adapted to this problem step by step."
-           - If you found CONCEPTUAL information (like formulas or principles), explain: "The context PDF provides key formulas/principles for [topic] which apply to this problem, specifically [mention specific formula/principle] and explain this CONCEPTUAL information can be used to solve the problem step by step."
-           - If NO relevant information was found, state: "The context PDF does not contain information applicable to this problem. I will solve it using my standard JEE Advanced knowledge."
-        
-        3. Provide a complete, step-by-step solution with:
-           - Clear identification of the mathematical principles and formulas being applied
-           - Where relevant, explicitly mention how you're applying information from the context PDF
-           - Every step of calculation shown explicitly
-           - Explanation of the reasoning at each step
-           - Format mathematical expressions clearly using proper notation
-        
-        4. End with the final answer clearly marked as "**Answer:** [final result]"
-        
-        5. Separate each question with a horizontal line (---) for clarity
-        
-        IMPORTANT: 
-        - You MUST preserve and present the exact question text as it appears in the PDF before attempting to solve it.
-        - Be specific about how context information is being used in your solution rather than making general claims.
-        - Relevant information doesn't just mean identical problems - it includes related concepts, applicable formulas, similar problem-solving techniques, or explanations that clarify the underlying principles.
-        """.format(state["context_text"], state["questions_text"], relevance_info)
-    else:
-        prompt = """
-        You are an expert at solving JEE Advanced level problems. Your task is to extract questions from the questions PDF and provide detailed solutions.
-        
-        QUESTIONS TEXT:
-        {}
-        
-        FORMAT INSTRUCTIONS:
-        For each question you identify in the QUESTIONS TEXT:
-        
-        1. First, extract and present the EXACT question as it appears in the original text, preserving all mathematical notation, question numbers, and formatting.
-           Format: "**Question X:** [exact question text as it appears in the PDF]" (replace X with the actual question number)
-        
-        2. MANDATORY: State: "**Analysis:** Solving this question using standard JEE Advanced knowledge on [identify the specific topic/concept]."
-        
-        3. Provide a complete, step-by-step solution with:
-           - Clear identification of the mathematical principles and formulas being applied
-           - Every step of calculation shown explicitly
-           - Explanation of the reasoning at each step
-           - Format mathematical expressions clearly using proper notation
-        
-        4. End with the final answer clearly marked as "**Answer:** [final result]"
-        
-        5. Separate each question with a horizontal line (---) for clarity
-        
-        IMPORTANT: You MUST preserve and present the exact question text as it appears in the PDF before attempting to solve it. Do not paraphrase or summarize the questions.
-        """.format(state["questions_text"])
-    
-    solved_answers = call_gemini_with_retry(prompt, state["api_key"])
-    
-    state["generated_answers"] = {
-        "Solutions": solved_answers,
-        "Context_Used": has_context,
-        "Relevance_Analysis": relevance_info if has_context else ""
-    }
-    
-    with st.empty():
-        st.subheader("AI Analysis & Solutions")
-        if has_context:
-            st.info("Solutions generated with context material where applicable. The AI has analyzed the context PDF for relevant information and will explain how it uses this information for each question.")
-        else:
-            st.info("Solutions generated using AI knowledge (no context material provided).")
-        st.success(solved_answers)
-    
-    return state
-
-# Add nodes to graph
-graph.add_node("analyze_context", analyze_context_relevance)
-graph.add_node("solve_questions", solve_questions)
-
-# Add edges
-if "analyze_context" in graph.nodes and "solve_questions" in graph.nodes:
-    graph.add_edge("analyze_context", "solve_questions")
-    graph.set_entry_point("analyze_context")
-else:
-    graph.set_entry_point("solve_questions")
-
-executor = graph.compile()
+job_manager = get_job_manager()
+job_store = job_manager.store
 
 # Streamlit UI
 st.set_page_config(page_title="JEE Advanced Solver Pro", layout="wide")
@@ -261,110 +44,222 @@ with col2:
     context_pdf = st.file_uploader("📂 Upload Context PDF (Optional)", type=["pdf"], 
                                   help="PDF containing study material, concepts, formulas, solved examples, or any relevant information")
 
+stream_output = st.toggle("📡 Stream solutions as they are generated", value=True,
+                          help="Show each solution while Gemini is still writing it instead of waiting for the whole paper.")
+max_workers = st.slider("⚙️ Questions solved in parallel", min_value=1, max_value=16, value=DEFAULT_SOLVER_WORKERS,
+                        help="Each question is solved with its own Gemini call. Higher values finish faster but use more API quota at once.")
+prompt_token_budget = st.number_input("🧮 Prompt token budget per Gemini call", min_value=2000, max_value=200000,
+                                      value=DEFAULT_PROMPT_TOKEN_BUDGET, step=1000,
+                                      help="Context passages are packed into each prompt up to this many (estimated) tokens.")
+reuse_solutions = st.toggle("♻️ Only re-solve questions that changed since the last upload of this paper", value=True,
+                            help="Answers are kept per file name. On a corrected re-upload, questions whose text and context passages are unchanged keep their previous answers.")
+
+# Function to show a queued or running job, with the answers streamed so far
+def show_job_progress(job_id, status):
+    with st.expander("Processing Status", expanded=True):
+        st.caption(f"Job `{job_id}` for **{status['file_name']}**. You can refresh or leave this page; open the same link later to come back to this job.")
+        if status["state"] == JOB_QUEUED:
+            position = job_manager.queue_position(job_id)
+            st.info("⏳ Waiting for a free solver" + (f" (position {position} in the queue)..." if position else "..."))
+        else:
+            st.info("⚙️ Processing questions and generating solutions...")
+        for label, message in status["messages"].items():
+            st.caption(f"**{label}:** {message}")
+        progress = status["progress"]
+        if progress["total"]:
+            st.progress(progress["done"] / progress["total"], text=f"Solved {progress['done']} of {progress['total']} question(s)")
+    
+    partial = job_store.partial(job_id)
+    if partial and any(partial["answers"]):
+        st.subheader("AI Analysis & Solutions")
+        for answer in partial["answers"]:
+            if answer:
+                st.markdown(answer + " ▌")
+                st.markdown("---")
+
+# Function to show an extracted document a few pages at a time from the document store
+# (the same PDF uploaded as questions and context has one doc_id, so widget keys include the label)
+def show_document_pages(label, doc_id, height):
+    document = get_document_store().open(doc_id)
+    if document is None:
+        st.info(f"The extracted {label.lower()} text is no longer stored. Submit the paper again to view it.")
+        return
+    views = max(1, -(-document.page_count // PAGES_PER_VIEW))
+    view = 1
+    if views > 1:
+        view = st.number_input(f"{label} pages ({PAGES_PER_VIEW} per view)", min_value=1, max_value=views, value=1,
+                               key=f"{label}_{doc_id}_view")
+    start = (view - 1) * PAGES_PER_VIEW
+    stop = min(document.page_count, start + PAGES_PER_VIEW)
+    st.caption(f"Pages {start + 1}-{stop} of {document.page_count}")
+    st.text_area(f"{label} PDF Content", "\n\n".join(document.iter_pages(start, stop)), height=height)
+    document.close()
+
+# Function to show a finished job's solutions, run report and extracted text
+def show_job_result(job_id, status):
+    result = job_store.result(job_id)
+    has_context = bool(result.get("context_document"))
+    with st.expander("Processing Status", expanded=False):
+        st.success("✅ Questions Extracted Successfully!")
+        if status["context_file_name"] and result["context_error"]:
+            st.warning(f"Warning with context PDF: {result['context_error']}")
+            st.warning("Proceeding without context information.")
+        elif status["context_file_name"]:
+            st.success("✅ Context Material Extracted Successfully!")
+        else:
+            st.info("No context PDF provided. Solved questions using AI knowledge only.")
+        
+        st.success("🎉 Process Completed Successfully! Solutions are ready below.")
+        failed = result["generated_answers"].get("Failed_Questions") or []
+        if failed:
+            st.warning(f"Could not solve question(s) {', '.join(failed)} after retrying. Please try again later.")
+        
+        run_report = result.get("run_report") or {}
+        if run_report:
+            modes = run_report["modes"]
+            st.caption(
+                f"Planner: {modes['direct']} direct, {modes['fused']} fused, {modes['two_stage']} two-stage question(s) · "
+                f"~{run_report['planned_prompt_tokens']:,} prompt tokens in {run_report['planned_calls']} call(s), "
+                f"~{run_report['tokens_saved']:,} saved vs. {run_report['baseline_calls']} call(s) of the two-pass flow"
+            )
+        if run_report.get("reused_questions"):
+            st.caption(f"♻️ Reused {run_report['reused_questions']} unchanged answer(s) from the previous upload of this paper")
+        stage_seconds = result.get("stage_seconds") or {}
+        if stage_seconds:
+            st.caption("Stage latency: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in stage_seconds.items()))
+        service_stats = result.get("service_stats") or {}
+        if service_stats:
+            ocr_stats = service_stats.get("ocr_cache")
+            if ocr_stats:
+                st.caption(f"OCR cache: {ocr_stats['hits']} hits / {ocr_stats['misses']} misses · {ocr_stats['entries']} stored PDF(s)")
+            cache_stats = service_stats["response_cache"]
+            st.caption(f"Response cache: {cache_stats['hits']} hits ({cache_stats['memory_hits']} from memory) / {cache_stats['misses']} misses")
+            limiter_metrics = service_stats["rate_limiter"]
+            st.caption(
+                f"Gemini rate limiter: {limiter_metrics['requests']} requests, {limiter_metrics['throttled']} throttled, "
+                f"{limiter_metrics['retries']} retries, {limiter_metrics['queue_wait_seconds']:.1f}s queued, "
+                f"{limiter_metrics['throttled_seconds']:.1f}s backing off, admitted rate {limiter_metrics['rate_factor']:.0%}"
+            )
+    
+    # Show where the run spent its time and let it be exported for offline analysis
+    with st.expander("⏱️ Performance Trace"):
+        trace_summary = result.get("trace_summary") or {}
+        st.dataframe([
+            {
+                "Stage": name,
+                "Calls": stage["calls"],
+                "Seconds": round(stage["seconds"], 2),
+                "Max seconds": round(stage["max_seconds"], 2),
+                "Prompt tokens": stage.get("prompt_tokens", 0),
+                "Response tokens": stage.get("response_tokens", 0),
+                "Cache hits": stage.get("cache_hit", 0),
+                "Retries": stage.get("retries", 0),
+                "Pages": stage.get("pages", 0),
+            }
+            for name, stage in sorted(trace_summary.items(), key=lambda item: -item[1]["seconds"])
+        ], use_container_width=True)
+        trace_counters = result.get("trace_counters") or {}
+        if trace_counters:
+            st.caption(", ".join(f"{name}: {value}" for name, value in sorted(trace_counters.items())))
+        trace_col1, trace_col2 = st.columns(2)
+        with trace_col1:
+            st.download_button(
+                label="📥 Download Trace (Chrome/Perfetto JSON)",
+                data=job_store.read_text(job_id, "trace.json") or "",
+                file_name="jee_trace.json",
+                mime="application/json"
+            )
+        with trace_col2:
+            st.download_button(
+                label="📥 Download Metrics (Prometheus)",
+                data=job_store.read_text(job_id, "metrics.prom") or "",
+                file_name="jee_metrics.prom",
+                mime="text/plain"
+            )
+    
+    # Display results outside the expander
+    st.subheader("Solution Results")
+    if has_context:
+        st.info("""
+        🔍 **Enhanced Context Analysis:** For each question, the AI has:
+        - Identified specific concept connections between questions and context material
+        - Explained how relevant information from the context is applied in the solution
+        - Distinguished between direct examples, related concepts, and fundamental principles
+        """)
+    else:
+        st.info("🧠 Solutions were generated using AI knowledge since no context material was provided or processed.")
+    
+    # Add download buttons for solutions
+    solution_text = result["generated_answers"].get("Solutions", "")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="📥 Download Solutions as Text",
+            data=solution_text,
+            file_name="jee_solutions.txt",
+            mime="text/plain"
+        )
+    
+    # Create tabs for viewing solutions and analysis
+    if has_context:
+        tab1, tab2, tab3 = st.tabs(["Solutions", "Context Analysis", "Extracted Text"])
+        
+        with tab1:
+            st.markdown("### Detailed Solutions:")
+            st.markdown(solution_text)
+        
+        with tab2:
+            st.markdown("### Context Relevance Analysis:")
+            st.markdown(result["generated_answers"].get("Relevance_Analysis") or "No separate relevance pass was needed: each question's context passages were small enough to analyze within its solution.")
+        
+        with tab3:
+            st.markdown("### Extracted Questions Text:")
+            show_document_pages("Questions", result.get("questions_document"), height=250)
+            st.markdown("### Extracted Context Text:")
+            show_document_pages("Context", result["context_document"], height=250)
+    else:
+        tab1, tab2 = st.tabs(["Solutions", "Extracted Text"])
+        
+        with tab1:
+            st.markdown("### Detailed Solutions:")
+            st.markdown(solution_text)
+        
+        with tab2:
+            st.markdown("### Extracted Questions Text:")
+            show_document_pages("Questions", result.get("questions_document"), height=300)
+
 if api_key and mistral_api_key and questions_pdf:
     if st.button("🚀 Extract & Solve Questions"):
-        try:
-            with st.expander("Processing Status", expanded=True):
-                # Process Questions PDF
-                st.subheader("Step 1: Processing Questions PDF")
-                questions_url, questions_upload_error = upload_pdf_to_mistral(questions_pdf, mistral_api_key)
-                if questions_upload_error:
-                    st.error(questions_upload_error)
-                    st.stop()
-                
-                questions_text = extract_text_from_pdf_mistral(questions_url, mistral_api_key)
-                if "No text found" in questions_text:
-                    st.error("Failed to extract text from the questions PDF. Please try a different PDF or check if it contains readable text.")
-                    st.stop()
-                st.success("✅ Questions Extracted Successfully!")
-                
-                # Process Context PDF if provided
-                context_text = ""
-                if context_pdf:
-                    st.subheader("Step 2: Processing Context PDF")
-                    context_url, context_upload_error = upload_pdf_to_mistral(context_pdf, mistral_api_key)
-                    if context_upload_error:
-                        st.warning(f"Warning with context PDF: {context_upload_error}")
-                        st.warning("Proceeding without context information.")
-                    else:
-                        context_text = extract_text_from_pdf_mistral(context_url, mistral_api_key)
-                        if "No text found" in context_text:
-                            st.warning("No readable text found in the context PDF. Proceeding with AI knowledge only.")
-                        else:
-                            st.success("✅ Context Material Extracted Successfully!")
-                            st.info("⏳ Analyzing context material for relevance to questions...")
-                else:
-                    st.info("No context PDF provided. Will solve questions using AI knowledge only.")
-                
-                # Run AI Agent
-                step_num = 3 if context_pdf else 2
-                st.subheader(f"Step {step_num}: Running AI Agent to Analyze & Solve ⚙️")
-                
-                with st.spinner("Processing questions and generating solutions..."):
-                    state = executor.invoke({
-                        "api_key": api_key,
-                        "questions_text": questions_text,
-                        "context_text": context_text,
-                        "generated_answers": {}
-                    })
-                
-                st.success("🎉 Process Completed Successfully! Solutions are ready below.")
-            
-            # Display results outside the expander
-            st.subheader("Solution Results")
-            if context_pdf and "No text found" not in context_text and "Error:" not in context_text:
-                st.info("""
-                🔍 **Enhanced Context Analysis:** For each question, the AI has:
-                - Identified specific concept connections between questions and context material
-                - Explained how relevant information from the context is applied in the solution
-                - Distinguished between direct examples, related concepts, and fundamental principles
-                """)
-            else:
-                st.info("🧠 Solutions were generated using AI knowledge since no context material was provided or processed.")
-            
-            # Add download buttons for solutions
-            solution_text = state["generated_answers"].get("Solutions", "")
-            col1, col2 = st.columns(2)
-            with col1:
-                st.download_button(
-                    label="📥 Download Solutions as Text",
-                    data=solution_text,
-                    file_name="jee_solutions.txt",
-                    mime="text/plain"
-                )
-            
-            # Create tabs for viewing solutions and analysis
-            if context_pdf and "No text found" not in context_text and "Error:" not in context_text:
-                tab1, tab2, tab3 = st.tabs(["Solutions", "Context Analysis", "Extracted Text"])
-                
-                with tab1:
-                    st.markdown("### Detailed Solutions:")
-                    st.markdown(solution_text)
-                
-                with tab2:
-                    st.markdown("### Context Relevance Analysis:")
-                    st.markdown(state["generated_answers"].get("Relevance_Analysis", "No relevance analysis available."))
-                
-                with tab3:
-                    st.markdown("### Extracted Questions Text:")
-                    st.text_area("Questions PDF Content", questions_text, height=250)
-                    if context_pdf and context_text and "No text found" not in context_text:
-                        st.markdown("### Extracted Context Text:")
-                        st.text_area("Context PDF Content", context_text, height=250)
-            else:
-                tab1, tab2 = st.tabs(["Solutions", "Extracted Text"])
-                
-                with tab1:
-                    st.markdown("### Detailed Solutions:")
-                    st.markdown(solution_text)
-                
-                with tab2:
-                    st.markdown("### Extracted Questions Text:")
-                    st.text_area("Questions PDF Content", questions_text, height=300)
-        
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
-            st.error("Please check your API keys and try again.")
+        # The solve runs on the shared job workers, so reruns and refreshes do not interrupt it
+        job_id, submit_error = job_manager.submit(questions_pdf, context_pdf, api_key, mistral_api_key, {
+            "max_workers": max_workers,
+            "prompt_token_budget": int(prompt_token_budget),
+            "top_k_passages": DEFAULT_TOP_K,
+            "stream_output": stream_output,
+            "reuse_solutions": reuse_solutions,
+        })
+        if submit_error:
+            st.error(submit_error)
+        else:
+            st.session_state["job_id"] = job_id
+            st.query_params["job"] = job_id
+
+# Reattach to this session's job, or to the job in the page link after a refresh
+job_id = st.session_state.get("job_id") or st.query_params.get("job")
+if job_id:
+    st.session_state["job_id"] = job_id
+    status = job_store.status(job_id)
+    if status is None:
+        st.warning("This job could not be found. It may have expired; please submit the paper again.")
+    elif status["state"] == JOB_DONE:
+        show_job_result(job_id, status)
+    elif status["state"] == JOB_FAILED:
+        st.error(status["error"])
+        st.error("Please check your API keys and try again.")
+    else:
+        show_job_progress(job_id, status)
+        time.sleep(POLL_SECONDS)
+        st.rerun()
 else:
     if not api_key or not mistral_api_key:
         st.warning("Please enter both API keys to proceed.")
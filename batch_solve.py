@@ -0,0 +1,250 @@
+"""Headless batch solver: runs the JEE pipeline over many question/context PDF pairs without the Streamlit UI.
+
+Usage:
+    python batch_solve.py papers/                      # every *.pdf, with <name>.context.pdf as its context
+    python batch_solve.py manifest.jsonl --parallelism 4 --format markdown
+
+Manifest lines look like {"id": "paper-1", "questions": "p1.pdf", "context": "book.pdf"}; "id" and
+"context" are optional and relative paths are resolved against the manifest's directory. API keys
+are read from --gemini-api-key / --mistral-api-key or the GEMINI_API_KEY / MISTRAL_API_KEY
+environment variables (a .env file is honoured).
+
+Completed papers are recorded in <output-dir>/checkpoint.jsonl, so re-running the same command
+after a crash continues with the papers that have not finished yet; solutions.jsonl keeps only the
+latest record per paper id. A paper whose PDFs changed is solved again, but only its added or changed questions are sent to Gemini (see --no-reuse). With --trace-dir, each paper's
+timing trace is written as <id>.trace.json (Chrome/Perfetto format) next to a metrics.prom file
+with the totals over the whole batch.
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from pipeline import LocalPDF, run_pipeline, DEFAULT_SOLVER_WORKERS, DEFAULT_TOP_K
+from planner import DEFAULT_PROMPT_TOKEN_BUDGET
+from tracing import export_prometheus
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "batch")
+CONTEXT_SUFFIX = ".context.pdf"
+
+# Function to collect question/context pairs from a directory or a manifest file
+def load_papers(input_path):
+    papers = []
+    if os.path.isdir(input_path):
+        for name in sorted(os.listdir(input_path)):
+            if not name.lower().endswith(".pdf") or name.lower().endswith(CONTEXT_SUFFIX):
+                continue
+            stem = name[:-len(".pdf")]
+            context_path = os.path.join(input_path, stem + CONTEXT_SUFFIX)
+            papers.append({
+                "id": stem,
+                "questions": os.path.join(input_path, name),
+                "context": context_path if os.path.exists(context_path) else None,
+            })
+        return papers
+
+    base_dir = os.path.dirname(os.path.abspath(input_path))
+    with open(input_path, "r", encoding="utf-8") as f:
+        if input_path.lower().endswith(".json"):
+            entries = json.load(f)
+        else:
+            entries = [json.loads(line) for line in f if line.strip()]
+    for entry in entries:
+        questions_path = os.path.join(base_dir, entry["questions"])
+        context_path = os.path.join(base_dir, entry["context"]) if entry.get("context") else None
+        papers.append({
+            "id": entry.get("id") or os.path.splitext(os.path.basename(questions_path))[0],
+            "questions": questions_path,
+            "context": context_path,
+        })
+    return papers
+
+# Function to fingerprint a paper's inputs so a changed PDF is solved again on resume
+def paper_fingerprint(paper):
+    digest = hashlib.sha256()
+    for path in (paper["questions"], paper["context"]):
+        if path:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class Checkpoint:
+    """Append-only record of finished papers, used to resume an interrupted batch."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.completed = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A crash can leave a truncated last line
+                        continue
+                    if record.get("status") == "done":
+                        self.completed[record["id"]] = record["fingerprint"]
+                    else:
+                        self.completed.pop(record["id"], None)
+
+    def is_done(self, paper_id, fingerprint):
+        return self.completed.get(paper_id) == fingerprint
+
+    def record(self, paper_id, fingerprint, status, error=None):
+        entry = {"id": paper_id, "fingerprint": fingerprint, "status": status, "error": error, "finished_at": time.time()}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if status == "done":
+                self.completed[paper_id] = fingerprint
+
+# Function to write one paper's solutions in the requested format
+def write_result(output_dir, output_format, paper, state, lock):
+    answers = state["generated_answers"]
+    if output_format == "markdown":
+        path = os.path.join(output_dir, f"{paper['id']}.md")
+        sections = [f"# {paper['id']}", answers.get("Solutions", "")]
+        if answers.get("Relevance_Analysis"):
+            sections += ["## Context Relevance Analysis", answers["Relevance_Analysis"]]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(sections) + "\n")
+        os.replace(tmp_path, path)
+        return
+    record = {
+        "id": paper["id"],
+        "questions_pdf": paper["questions"],
+        "context_pdf": paper["context"],
+        "context_used": bool(answers.get("Context_Used")),
+        "context_error": state.get("context_error"),
+        "failed_questions": answers.get("Failed_Questions", []),
+        "solutions": answers.get("Solutions", ""),
+        "relevance_analysis": answers.get("Relevance_Analysis", ""),
+        "run_report": state.get("run_report"),
+        "stage_seconds": state.get("stage_seconds"),
+    }
+    # Rewritten as a whole, keyed by id, so a paper solved again replaces its earlier record
+    path = os.path.join(output_dir, "solutions.jsonl")
+    with lock:
+        lines = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        if json.loads(line).get("id") != paper["id"]:
+                            lines.append(line.rstrip("\n"))
+                    except ValueError:
+                        continue
+        lines.append(json.dumps(record, ensure_ascii=False))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+# Function to drain the job queue on one worker thread
+def run_worker(jobs, args, checkpoint, output_lock, summary):
+    while True:
+        try:
+            paper, fingerprint = jobs.get_nowait()
+        except queue.Empty:
+            return
+        started = time.monotonic()
+        try:
+            state, error = run_pipeline(
+                LocalPDF(paper["questions"]),
+                LocalPDF(paper["context"]) if paper["context"] else None,
+                args.gemini_api_key, args.mistral_api_key,
+                max_workers=args.max_workers, top_k_passages=args.top_k,
+                prompt_token_budget=args.token_budget,
+                paper_key=None if args.no_reuse else paper["id"],
+            )
+            if error is None:
+                write_result(args.output_dir, args.format, paper, state, output_lock)
+                if args.trace_dir:
+                    with open(os.path.join(args.trace_dir, f"{paper['id']}.trace.json"), "w", encoding="utf-8") as f:
+                        f.write(state["trace"].to_chrome_trace())
+        except Exception as e:
+            error = f"Error: {e}"
+        status = "failed" if error else "done"
+        checkpoint.record(paper["id"], fingerprint, status, error)
+        with output_lock:
+            summary[status] += 1
+            detail = f" ({error})" if error else ""
+            print(f"[{status}] {paper['id']} in {time.monotonic() - started:.1f}s{detail}", flush=True)
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Solve many JEE question papers without the Streamlit UI.")
+    parser.add_argument("input", help="Directory of question PDFs, or a .jsonl/.json manifest of question/context pairs")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Where solutions and the checkpoint are written (default: data/batch)")
+    parser.add_argument("--format", choices=["jsonl", "markdown"], default="jsonl", help="Output format (default: jsonl)")
+    parser.add_argument("--parallelism", type=int, default=2, help="Papers processed at the same time (default: 2)")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_SOLVER_WORKERS, help="Questions solved in parallel per paper")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Context passages retrieved per question")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_PROMPT_TOKEN_BUDGET, help="Estimated prompt tokens allowed per Gemini call")
+    parser.add_argument("--gemini-api-key", default=os.environ.get("GEMINI_API_KEY"))
+    parser.add_argument("--mistral-api-key", default=os.environ.get("MISTRAL_API_KEY"))
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and solve every paper again")
+    parser.add_argument("--no-reuse", action="store_true", help="Solve every question again instead of reusing answers to unchanged questions from data/solutions")
+    parser.add_argument("--trace-dir", help="Write a per-paper timing trace and batch-wide Prometheus metrics here")
+    args = parser.parse_args(argv)
+
+    if not args.gemini_api_key or not args.mistral_api_key:
+        parser.error("Both a Gemini and a Mistral API key are required.")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.trace_dir:
+        os.makedirs(args.trace_dir, exist_ok=True)
+    checkpoint_path = os.path.join(args.output_dir, "checkpoint.jsonl")
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+
+    jobs = queue.Queue()
+    skipped = 0
+    summary = {"done": 0, "failed": 0}
+    for paper in load_papers(args.input):
+        try:
+            fingerprint = paper_fingerprint(paper)
+        except OSError as e:
+            # A missing or unreadable PDF fails that paper only
+            error = f"Error: {e}"
+            checkpoint.record(paper["id"], None, "failed", error)
+            summary["failed"] += 1
+            print(f"[failed] {paper['id']} ({error})", flush=True)
+            continue
+        if checkpoint.is_done(paper["id"], fingerprint):
+            skipped += 1
+            continue
+        jobs.put((paper, fingerprint))
+    print(f"{jobs.qsize()} paper(s) to solve, {skipped} already completed.", flush=True)
+
+    output_lock = threading.Lock()
+    workers = [
+        threading.Thread(target=run_worker, args=(jobs, args, checkpoint, output_lock, summary), daemon=True)
+        for _ in range(max(1, args.parallelism))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    if args.trace_dir:
+        with open(os.path.join(args.trace_dir, "metrics.prom"), "w", encoding="utf-8") as f:
+            f.write(export_prometheus())
+    print(f"Finished: {summary['done']} solved, {summary['failed']} failed, {skipped} skipped.", flush=True)
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
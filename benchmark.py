@@ -0,0 +1,493 @@
+"""Offline benchmark: runs the full JEE pipeline against local stand-ins for Mistral and Gemini.
+
+Usage:
+    python benchmark.py                                        # small, medium and no-context papers
+    python benchmark.py --corpus large --profile throttled --output results.json
+    python benchmark.py --compare results.json                 # exits with 1 on a regression
+    python benchmark.py --papers papers/ --fixtures data       # replay OCR pages and responses recorded by real runs
+
+The stand-ins are pooled in place of the real clients (see resources.install_mistral_client and
+install_gemini_model), so upload, paged OCR, segmentation, retrieval, planning, the relevance
+pass and solving all run the production code, including the rate limiter and retries. Service
+latency, failures and quota errors come from a profile. The OCR, index and response caches and
+the document store are redirected to a temporary directory, so every run starts cold and data/
+is left untouched.
+
+Synthetic papers are tiny PDF stubs that carry the page count and a generator seed; the fake OCR
+turns them into question or study-material pages. With --fixtures, a directory holding ocr_cache/,
+documents/ and llm_cache/ from real runs (such as data/) is replayed instead wherever it has a
+recording.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import llm_cache
+import pipeline
+from batch_solve import load_papers
+from context_retrieval import ContextIndexStore
+from document_store import DocumentStore
+from llm_cache import ResponseCache
+from ocr_cache import OCRCache
+from pipeline import LocalPDF, run_pipeline, DEFAULT_SOLVER_WORKERS, DEFAULT_TOP_K
+from planner import DEFAULT_PROMPT_TOKEN_BUDGET
+from rate_limiter import AdaptiveRateLimiter, install_rate_limiter, estimate_tokens, DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE
+from resources import install_mistral_client, install_gemini_model, GEMINI_MODEL
+
+GEMINI_API_KEY = "benchmark-gemini"
+MISTRAL_API_KEY = "benchmark-mistral"
+
+# Service behaviour per profile; latencies are in seconds and scaled by --latency-scale
+PROFILES = {
+    # No service latency: measures the pipeline's own overhead
+    "instant": {"upload_seconds": 0.0, "ocr_page_seconds": 0.0, "gemini_seconds": 0.0, "gemini_jitter": 0.0,
+                "response_tokens": 600, "failure_rate": 0.0, "rate_limit_rate": 0.0},
+    "realistic": {"upload_seconds": 0.5, "ocr_page_seconds": 0.15, "gemini_seconds": 2.0, "gemini_jitter": 1.0,
+                  "response_tokens": 600, "failure_rate": 0.0, "rate_limit_rate": 0.0},
+    # Occasional server errors, which are retried per question
+    "flaky": {"upload_seconds": 0.5, "ocr_page_seconds": 0.15, "gemini_seconds": 2.0, "gemini_jitter": 1.0,
+              "response_tokens": 600, "failure_rate": 0.05, "rate_limit_rate": 0.0},
+    # Frequent quota errors, which exercise the adaptive limiter and backoff
+    "throttled": {"upload_seconds": 0.5, "ocr_page_seconds": 0.15, "gemini_seconds": 2.0, "gemini_jitter": 1.0,
+                  "response_tokens": 600, "failure_rate": 0.0, "rate_limit_rate": 0.15},
+}
+
+CORPUS = {
+    "small": {"questions": 10, "context_pages": 20},
+    "medium": {"questions": 50, "context_pages": 200},
+    "large": {"questions": 200, "context_pages": 1000},
+    "no_context": {"questions": 30, "context_pages": 0},
+}
+DEFAULT_CORPUS = "small,medium,no_context"
+QUESTIONS_PER_PAGE = 4
+STREAM_CHUNKS = 8
+
+TOPICS = [
+    ("kinematics", "velocity acceleration displacement projectile trajectory particle time height range launch".split()),
+    ("electrostatics", "charge field potential capacitor dielectric coulomb gauss flux plate energy".split()),
+    ("thermodynamics", "heat entropy gas isothermal adiabatic work temperature pressure volume cycle".split()),
+    ("optics", "lens mirror refraction focal image wavelength interference fringe slit prism".split()),
+    ("organic chemistry", "alkene reaction mechanism nucleophile carbocation ester aldehyde ketone substitution elimination".split()),
+    ("chemical equilibrium", "equilibrium constant concentration reaction ph buffer solubility dissociation le chatelier".split()),
+    ("calculus", "integral derivative limit function continuity maxima minima area curve differentiable".split()),
+    ("probability", "probability event random variable conditional bayes distribution dice outcome independent".split()),
+]
+FILLER_WORDS = "the a of in and is to for with given consider shown figure value system when at by as".split()
+
+SPEC_MARKER = b"%JEE-BENCH "
+
+class CallCounter:
+    """Thread-safe counts of calls made to the stand-in services."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def add(self, name, value=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._counts = {}
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+# Function to build a stub PDF that carries its page count and a generator spec for the fake OCR
+def synthetic_pdf(spec, page_count):
+    return (b"%PDF-1.4\n" + SPEC_MARKER + json.dumps(spec).encode("utf-8") + b"\n"
+            + f"1 0 obj << /Type /Pages /Count {page_count} >> endobj\n".encode("ascii")
+            # Books usually carry an outline, whose /Count is not a page count
+            + f"2 0 obj << /Type /Outlines /Count {page_count * 3 + 10} >> endobj\n".encode("ascii") + b"%%EOF\n")
+
+def read_spec(pdf_bytes):
+    start = pdf_bytes.find(SPEC_MARKER)
+    if start < 0:
+        return None
+    start += len(SPEC_MARKER)
+    return json.loads(pdf_bytes[start:pdf_bytes.index(b"\n", start)])
+
+def synthetic_question(number, seed):
+    rng = random.Random(f"{seed}:q{number}")
+    topic, words = TOPICS[(number - 1) % len(TOPICS)]
+    body = " ".join(rng.choice(words if rng.random() < 0.6 else FILLER_WORDS) for _ in range(rng.randint(40, 120)))
+    return f"Q{number}. A problem on {topic}: {body}. Find the required value.\n(A) 1 (B) 2 (C) 3 (D) 4"
+
+def synthetic_context_page(index, seed):
+    rng = random.Random(f"{seed}:p{index}")
+    topic, words = TOPICS[index % len(TOPICS)]
+    paragraphs = [
+        " ".join(rng.choice(words if rng.random() < 0.5 else FILLER_WORDS) for _ in range(rng.randint(80, 140))) + "."
+        for _ in range(3)
+    ]
+    return f"## {topic.title()} (page {index + 1})\n\n" + "\n\n".join(paragraphs)
+
+def synthetic_page(spec, index):
+    if spec["kind"] == "questions":
+        first = index * QUESTIONS_PER_PAGE + 1
+        last = min(spec["questions"], first + QUESTIONS_PER_PAGE - 1)
+        return "\n\n".join(synthetic_question(number, spec["seed"]) for number in range(first, last + 1))
+    return synthetic_context_page(index, spec["seed"])
+
+# Function to write the synthetic corpus to disk in the same layout batch_solve.py reads
+def build_corpus(names, output_dir, seed):
+    papers = []
+    for offset, name in enumerate(names):
+        size = CORPUS[name]
+        paper_seed = seed * 1000 + offset
+        question_pages = -(-size["questions"] // QUESTIONS_PER_PAGE)
+        questions_path = os.path.join(output_dir, f"{name}.pdf")
+        with open(questions_path, "wb") as f:
+            f.write(synthetic_pdf({"kind": "questions", "questions": size["questions"], "seed": paper_seed}, question_pages))
+        context_path = None
+        if size["context_pages"]:
+            context_path = os.path.join(output_dir, f"{name}.context.pdf")
+            with open(context_path, "wb") as f:
+                f.write(synthetic_pdf({"kind": "context", "pages": size["context_pages"], "seed": paper_seed}, size["context_pages"]))
+        papers.append({"id": name, "questions": questions_path, "context": context_path})
+    return papers
+
+class FakeAPIError(Exception):
+    """Error raised by the stand-in services, carrying an HTTP status like the real SDK errors."""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"Status {status_code}: {message}")
+        self.status_code = status_code
+
+class ServiceProfile:
+    """Samples latencies and injected errors for the stand-in services."""
+
+    def __init__(self, settings, latency_scale, seed):
+        self.settings = settings
+        self.latency_scale = latency_scale
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self, seconds):
+        if seconds > 0 and self.latency_scale > 0:
+            time.sleep(seconds * self.latency_scale)
+
+    def gemini_latency(self):
+        with self._lock:
+            jitter = self._rng.uniform(-1.0, 1.0) * self.settings["gemini_jitter"]
+        return max(0.0, self.settings["gemini_seconds"] + jitter)
+
+    def maybe_fail(self, counter, service):
+        """Raises a quota error or a server error at the profile's rates."""
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.settings["rate_limit_rate"]:
+            counter.add(f"{service}_throttled")
+            raise Exception("429 Resource has been exhausted (e.g. check quota).")
+        if roll < self.settings["rate_limit_rate"] + self.settings["failure_rate"]:
+            counter.add(f"{service}_failed")
+            raise Exception("500 An internal error has occurred.")
+
+class FakeMistral:
+    """Stand-in for the Mistral client exposing files.upload, files.get_signed_url and ocr.process."""
+
+    def __init__(self, profile, counter, recorded_ocr=None, recorded_documents=None):
+        self.profile = profile
+        self.counter = counter
+        self.recorded_ocr = recorded_ocr
+        self.recorded_documents = recorded_documents
+        self.files = SimpleNamespace(upload=self._upload, get_signed_url=self._get_signed_url)
+        self.ocr = SimpleNamespace(process=self._process)
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def _upload(self, file, purpose=None):
+        self.counter.add("mistral_upload")
+        self.profile.sleep(self.profile.settings["upload_seconds"])
+        content = file["content"]
+        if hasattr(content, "read"):
+            content = content.read()
+        file_id = hashlib.sha256(content).hexdigest()[:24]
+        with self._lock:
+            self._documents[file_id] = self._page_source(content)
+        return SimpleNamespace(id=file_id)
+
+    def _get_signed_url(self, file_id):
+        return SimpleNamespace(url=f"benchmark://{file_id}")
+
+    def _page_source(self, content):
+        """Returns (page_count, page_function) from a recording, the synthetic spec, or an empty document."""
+        if self.recorded_ocr is not None:
+            doc_id = self.recorded_ocr.get(self.recorded_ocr.make_key(content))
+            document = self.recorded_documents.open(doc_id) if doc_id else None
+            if document is not None:
+                self.counter.add("mistral_ocr_replayed")
+                return document.page_count, document.page
+        spec = read_spec(content)
+        if spec is None:
+            return 0, None
+        count = spec["pages"] if spec["kind"] == "context" else -(-spec["questions"] // QUESTIONS_PER_PAGE)
+        return count, lambda index: synthetic_page(spec, index)
+
+    def _process(self, model, document, pages=None, include_image_base64=False):
+        self.counter.add("mistral_ocr")
+        with self._lock:
+            count, page = self._documents[document["document_url"].split("://", 1)[1]]
+        indexes = list(pages) if pages is not None else list(range(count))
+        missing = [index for index in indexes if not 0 <= index < count]
+        if missing:
+            # Like the real service, a request for pages the document does not have is rejected as a whole
+            raise FakeAPIError(422, f"Invalid page index {missing[0]} for a document with {count} page(s)")
+        self.profile.sleep(self.profile.settings["ocr_page_seconds"] * max(1, len(indexes)))
+        self.profile.maybe_fail(self.counter, "mistral")
+        return SimpleNamespace(pages=[SimpleNamespace(index=index, markdown=page(index)) for index in indexes])
+
+class FakeStream:
+    """Streamed Gemini response: yields text chunks at the sampled pace, then exposes usage_metadata."""
+
+    def __init__(self, text, usage, latency, profile):
+        self.text = text
+        self.usage_metadata = usage
+        self._latency = latency
+        self._profile = profile
+
+    def __iter__(self):
+        size = max(1, -(-len(self.text) // STREAM_CHUNKS))
+        for start in range(0, len(self.text), size):
+            self._profile.sleep(self._latency / STREAM_CHUNKS)
+            yield SimpleNamespace(text=self.text[start:start + size])
+
+class FakeGeminiModel:
+    """Stand-in for a Gemini model handle exposing generate_content, with and without streaming."""
+
+    def __init__(self, profile, counter, recorded_responses=None):
+        self.profile = profile
+        self.counter = counter
+        self.recorded_responses = recorded_responses
+
+    def _response(self, prompt):
+        if self.recorded_responses is not None:
+            recorded = self.recorded_responses.get(self.recorded_responses.make_key(GEMINI_MODEL, prompt))
+            if recorded is not None:
+                self.counter.add("gemini_replayed")
+                return recorded
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        words = [rng.choice(FILLER_WORDS + TOPICS[rng.randrange(len(TOPICS))][1])
+                 for _ in range(self.profile.settings["response_tokens"] * 4 // 6)]
+        return "Solution: " + " ".join(words) + "\n\nFinal answer: (A)"
+
+    def generate_content(self, prompt, stream=False):
+        self.counter.add("gemini_calls")
+        self.profile.maybe_fail(self.counter, "gemini")
+        text = self._response(prompt)
+        prompt_tokens, response_tokens = estimate_tokens(prompt), estimate_tokens(text)
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=response_tokens,
+                                total_token_count=prompt_tokens + response_tokens)
+        latency = self.profile.gemini_latency()
+        if stream:
+            return FakeStream(text, usage, latency, self.profile)
+        self.profile.sleep(latency)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+# Function to point the process-wide caches at a scratch directory so runs start cold and data/ is untouched
+def use_isolated_caches(root):
+    pipeline._ocr_cache = OCRCache(cache_dir=os.path.join(root, "ocr_cache"))
+    pipeline._context_index_store = ContextIndexStore(index_dir=os.path.join(root, "context_index"))
+    llm_cache._response_cache = ResponseCache(cache_dir=os.path.join(root, "llm_cache"))
+    pipeline._document_store = DocumentStore(documents_dir=os.path.join(root, "documents"))
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+# Function to run one paper through the pipeline and collect its measurements
+def run_paper(paper, args, counter, run_number):
+    counter.reset()
+    # A fresh limiter per run, so quota used and rate cuts by one paper do not slow down the next
+    limiter = AdaptiveRateLimiter(args.requests_per_minute, args.tokens_per_minute)
+    install_rate_limiter(GEMINI_API_KEY, limiter)
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    state, error = run_pipeline(
+        LocalPDF(paper["questions"]),
+        LocalPDF(paper["context"]) if paper["context"] else None,
+        GEMINI_API_KEY, MISTRAL_API_KEY,
+        max_workers=args.max_workers, top_k_passages=args.top_k,
+        prompt_token_budget=args.token_budget, stream_output=args.stream,
+    )
+    seconds = time.perf_counter() - started
+    peak_bytes = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+
+    questions, failed, call_seconds, stage_seconds = 0, 0, [], {}
+    if state is not None:
+        questions = len(state["questions"])
+        failed = len(state["generated_answers"].get("Failed_Questions", []))
+        stage_seconds = state.get("stage_seconds") or {}
+        call_seconds = [
+            span_record["duration"] for span_record in state["trace"].spans
+            if span_record["name"] in ("gemini_call", "gemini_stream") and not span_record["attrs"].get("cache_hit")
+        ]
+    return {
+        "paper": paper["id"],
+        "run": run_number,
+        "questions": questions,
+        "failed_questions": failed,
+        "seconds": seconds,
+        "questions_per_second": questions / seconds if seconds else 0.0,
+        "gemini_call_p50_seconds": percentile(call_seconds, 0.5),
+        "gemini_call_p95_seconds": percentile(call_seconds, 0.95),
+        "gemini_call_seconds": call_seconds,
+        "limiter_wait_seconds": limiter.metrics()["queue_wait_seconds"],
+        "peak_memory_mb": peak_bytes / (1024 * 1024),
+        "calls": counter.snapshot(),
+        "stage_seconds": stage_seconds,
+        "error": error,
+    }
+
+def summarize(results):
+    """Aggregates per-paper results into the figures tracked across benchmark runs."""
+    total_seconds = sum(result["seconds"] for result in results)
+    call_seconds = [seconds for result in results for seconds in result["gemini_call_seconds"]]
+    paper_seconds = [result["seconds"] for result in results]
+    papers = max(1, len(results))
+    return {
+        "papers": len(results),
+        "errors": sum(1 for result in results if result["error"]),
+        "questions_per_second": sum(result["questions"] for result in results) / total_seconds if total_seconds else 0.0,
+        "paper_p50_seconds": percentile(paper_seconds, 0.5),
+        "paper_p95_seconds": percentile(paper_seconds, 0.95),
+        "gemini_call_p50_seconds": percentile(call_seconds, 0.5),
+        "gemini_call_p95_seconds": percentile(call_seconds, 0.95),
+        "limiter_wait_seconds_per_paper": sum(result["limiter_wait_seconds"] for result in results) / papers,
+        "peak_memory_mb": max((result["peak_memory_mb"] for result in results), default=0.0),
+        "gemini_calls_per_paper": sum(result["calls"].get("gemini_calls", 0) for result in results) / papers,
+        "ocr_calls_per_paper": sum(result["calls"].get("mistral_ocr", 0) for result in results) / papers,
+    }
+
+def print_report(results, summary):
+    header = f"{'paper':<14}{'run':>4}{'questions':>10}{'failed':>8}{'seconds':>9}{'q/s':>8}{'call p50':>10}{'call p95':>10}{'wait s':>8}{'peak MB':>9}{'gemini':>8}{'ocr':>6}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        calls = result["calls"]
+        print(f"{result['paper']:<14}{result['run']:>4}{result['questions']:>10}{result['failed_questions']:>8}"
+              f"{result['seconds']:>9.2f}{result['questions_per_second']:>8.2f}"
+              f"{result['gemini_call_p50_seconds']:>10.2f}{result['gemini_call_p95_seconds']:>10.2f}"
+              f"{result['limiter_wait_seconds']:>8.2f}{result['peak_memory_mb']:>9.1f}{calls.get('gemini_calls', 0):>8}{calls.get('mistral_ocr', 0):>6}"
+              + (f"  {result['error']}" if result["error"] else ""))
+    print()
+    print(f"Throughput {summary['questions_per_second']:.2f} questions/s · paper latency p50 {summary['paper_p50_seconds']:.2f}s "
+          f"p95 {summary['paper_p95_seconds']:.2f}s · Gemini call p50 {summary['gemini_call_p50_seconds']:.2f}s "
+          f"p95 {summary['gemini_call_p95_seconds']:.2f}s · rate limiter wait {summary['limiter_wait_seconds_per_paper']:.2f}s per paper · "
+          f"peak memory {summary['peak_memory_mb']:.1f} MB · "
+          f"{summary['gemini_calls_per_paper']:.1f} Gemini / {summary['ocr_calls_per_paper']:.1f} OCR calls per paper")
+
+# Metrics compared against a baseline run, and whether a higher value is better
+COMPARED_METRICS = {
+    "questions_per_second": True,
+    "paper_p50_seconds": False,
+    "paper_p95_seconds": False,
+    "limiter_wait_seconds_per_paper": False,
+    "peak_memory_mb": False,
+    "gemini_calls_per_paper": False,
+    "ocr_calls_per_paper": False,
+}
+
+def compare(summary, baseline, tolerance):
+    """Prints the change of each tracked metric and returns the names of those that regressed beyond tolerance."""
+    regressions = []
+    for name, higher_is_better in COMPARED_METRICS.items():
+        before, after = baseline.get(name), summary[name]
+        if not before:
+            continue
+        change = (after - before) / before
+        worse = -change if higher_is_better else change
+        flag = "REGRESSION" if worse > tolerance else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<26}{before:>10.2f} -> {after:>10.2f} ({change:+.1%}) {flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the JEE pipeline offline against stand-in OCR and LLM services.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help=f"Comma-separated synthetic papers from {', '.join(CORPUS)} (default: {DEFAULT_CORPUS})")
+    parser.add_argument("--papers", help="Also benchmark real papers from a directory or manifest, as accepted by batch_solve.py")
+    parser.add_argument("--fixtures", help="Directory with ocr_cache/, documents/ and llm_cache/ recorded by real runs (e.g. data) to replay")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic", help="Service latency and error profile (default: realistic)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for every simulated service latency")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per paper; runs after the first hit the warm caches")
+    parser.add_argument("--stream", action="store_true", help="Solve with streamed Gemini output, as the app does by default")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_SOLVER_WORKERS, help="Questions solved in parallel per paper")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Context passages retrieved per question")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_PROMPT_TOKEN_BUDGET, help="Estimated prompt tokens allowed per Gemini call")
+    parser.add_argument("--requests-per-minute", type=int, default=DEFAULT_REQUESTS_PER_MINUTE, help="Gemini rate limit applied by each run's limiter")
+    parser.add_argument("--tokens-per-minute", type=int, default=DEFAULT_TOKENS_PER_MINUTE, help="Gemini token limit applied by each run's limiter")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc, which slows the run down, and report no peak memory")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic corpus and the injected errors")
+    parser.add_argument("--output", help="Write per-paper results and the summary to this JSON file")
+    parser.add_argument("--compare", help="Compare the summary with a previous --output file and exit with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change that counts as a regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.corpus.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CORPUS]
+    if unknown:
+        parser.error(f"Unknown corpus entries: {', '.join(unknown)}")
+
+    counter = CallCounter()
+    profile = ServiceProfile(PROFILES[args.profile], args.latency_scale, args.seed)
+    recorded_ocr = recorded_documents = recorded_responses = None
+    if args.fixtures:
+        recorded_ocr = OCRCache(cache_dir=os.path.join(args.fixtures, "ocr_cache"))
+        recorded_documents = DocumentStore(documents_dir=os.path.join(args.fixtures, "documents"))
+        recorded_responses = ResponseCache(cache_dir=os.path.join(args.fixtures, "llm_cache"))
+    install_mistral_client(MISTRAL_API_KEY, FakeMistral(profile, counter, recorded_ocr, recorded_documents))
+    install_gemini_model(GEMINI_API_KEY, FakeGeminiModel(profile, counter, recorded_responses))
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="jee-benchmark-") as scratch:
+        use_isolated_caches(os.path.join(scratch, "caches"))
+        corpus_dir = os.path.join(scratch, "corpus")
+        os.makedirs(corpus_dir)
+        papers = build_corpus(names, corpus_dir, args.seed)
+        if args.papers:
+            papers += load_papers(args.papers)
+        print(f"Benchmarking {len(papers)} paper(s) with the '{args.profile}' profile...", flush=True)
+
+        if not args.no_memory:
+            tracemalloc.start()
+        try:
+            for paper in papers:
+                for run_number in range(1, max(1, args.repeat) + 1):
+                    result = run_paper(paper, args, counter, run_number)
+                    results.append(result)
+                    print(f"[{'failed' if result['error'] else 'done'}] {paper['id']} run {run_number} in {result['seconds']:.1f}s", flush=True)
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    summary = summarize(results)
+    print()
+    print_report(results, summary)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"profile": args.profile, "args": vars(args), "summary": summary, "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["summary"]
+        print()
+        if compare(summary, baseline, args.tolerance):
+            return 1
+    return 1 if summary["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
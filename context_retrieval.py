@@ -0,0 +1,232 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "context_index")
+DEFAULT_PASSAGE_WORDS = 180
+DEFAULT_TOP_K = 5
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Bumped whenever tokenization or the stored layout changes, so indexes persisted by older versions are rebuilt
+INDEX_FORMAT = "bm25-v3"
+
+# Words with at least one letter; bare numbers such as the "2" in "2 kg" match unrelated passages
+TOKEN_PATTERN = re.compile(r"[a-z0-9]*[a-z][a-z0-9]*")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have if in into is it its of on or such that the their then there these
+they this to was were which will with what when where who why how can find given let value following correct
+""".split())
+
+def tokenize(text):
+    """Lowercases text and splits it into index terms, dropping common stopwords and bare numbers."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def chunk_passages(text, max_words=DEFAULT_PASSAGE_WORDS):
+    """Splits context markdown into passages of roughly max_words words along paragraph boundaries."""
+    return chunk_pages([text], max_words)
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+WORD = re.compile(r"\S+")
+
+def iter_paragraphs(pages):
+    """Yields (page_index, start, end, page) for each non-blank paragraph, with surrounding whitespace trimmed."""
+    for page_index, page in enumerate(pages):
+        start = 0
+        for end, next_start in [(brk.start(), brk.end()) for brk in PARAGRAPH_BREAK.finditer(page)] + [(len(page), None)]:
+            raw = page[start:end]
+            stripped = raw.strip()
+            if stripped:
+                begin = start + len(raw) - len(raw.lstrip())
+                yield page_index, begin, begin + len(stripped), page
+            start = next_start
+
+def iter_passages(pages, max_words=DEFAULT_PASSAGE_WORDS):
+    """Like chunk_passages over the pages joined by blank lines, reading one page at a time.
+
+    Yields (location, text) per passage. A location is [words, spans] with spans a list of
+    [page_index, start, end] character ranges; passage_text rebuilds the text from it, so an index
+    can keep locations instead of the passages themselves.
+    """
+    current, current_words = [], 0
+    for page_index, start, end, page in iter_paragraphs(pages):
+        words = list(WORD.finditer(page, start, end))
+        # Paragraphs longer than a passage are cut into word windows on their own
+        if len(words) > max_words:
+            if current:
+                yield [False, [span for span, _ in current]], "\n\n".join(text for _, text in current)
+                current, current_words = [], 0
+            for i in range(0, len(words), max_words):
+                window = words[i:i + max_words]
+                yield [True, [[page_index, window[0].start(), window[-1].end()]]], " ".join(word.group() for word in window)
+            continue
+        if current and current_words + len(words) > max_words:
+            yield [False, [span for span, _ in current]], "\n\n".join(text for _, text in current)
+            current, current_words = [], 0
+        current.append(([page_index, start, end], page[start:end]))
+        current_words += len(words)
+    if current:
+        yield [False, [span for span, _ in current]], "\n\n".join(text for _, text in current)
+
+def chunk_pages(pages, max_words=DEFAULT_PASSAGE_WORDS):
+    """Returns the text of every passage of iter_passages."""
+    return [text for _, text in iter_passages(pages, max_words)]
+
+def passage_text(document, location):
+    """Reads a passage back from its location in a document (anything with page(index))."""
+    words, spans = location
+    pages = {}
+    parts = []
+    for page_index, start, end in spans:
+        if page_index not in pages:
+            pages[page_index] = document.page(page_index)
+        parts.append(pages[page_index][start:end])
+    return " ".join(parts[0].split()) if words else "\n\n".join(parts)
+
+class BM25Index:
+    """Okapi BM25 ranking over an inverted index of context passages.
+
+    The index holds passage locations rather than passage text; the text of a hit is read back
+    from the document with passage(), so only the top-k passages per question are ever loaded.
+    """
+
+    def __init__(self, locations, postings, doc_lengths, k1=1.5, b=0.75):
+        self.locations = locations
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+        total = len(locations)
+        self.idf = {
+            term: math.log(1 + (total - len(entries) + 0.5) / (len(entries) + 0.5))
+            for term, entries in postings.items()
+        }
+
+    @classmethod
+    def build(cls, passages, k1=1.5, b=0.75):
+        """Indexes (location, text) pairs such as those yielded by iter_passages."""
+        locations = []
+        postings = {}
+        doc_lengths = []
+        for doc_id, (location, passage) in enumerate(passages):
+            locations.append(location)
+            counts = Counter(tokenize(passage))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append([doc_id, tf])
+        return cls(locations, postings, doc_lengths, k1=k1, b=b)
+
+    def passage(self, document, doc_id):
+        """Returns the text of one passage, read from the document the index was built over."""
+        return passage_text(document, self.locations[doc_id])
+
+    def search(self, query, top_k=DEFAULT_TOP_K):
+        """Returns up to top_k (doc_id, score) pairs for the query, best first."""
+        scores = {}
+        for term in set(tokenize(query)):
+            entries = self.postings.get(term)
+            if not entries:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in entries:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avg_length or 1.0))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k]
+
+    def max_score(self, query):
+        """Upper bound of search scores for the query, reached by a passage holding every query term many times.
+
+        Terms missing from the index count with the idf of an unseen term, so a question that
+        shares few words with the context material gets a low score relative to this bound.
+        """
+        unseen_idf = math.log(1 + (len(self.doc_lengths) + 0.5) / 0.5)
+        return (self.k1 + 1) * sum(self.idf.get(term, unseen_idf) for term in set(tokenize(query)))
+
+    def relevance(self, query, score):
+        """Returns score as a fraction of max_score(query), comparable across questions and books."""
+        ceiling = self.max_score(query)
+        return score / ceiling if ceiling else 0.0
+
+    def to_dict(self):
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "locations": self.locations,
+            "postings": self.postings,
+            "doc_lengths": self.doc_lengths,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["locations"], data["postings"], data["doc_lengths"], k1=data["k1"], b=data["b"])
+
+class ContextIndexStore:
+    """Persists BM25 indexes under data/ so the same context material is only indexed once.
+
+    Indexes are evicted least recently used first once the directory grows past max_bytes.
+    """
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR, passage_words=DEFAULT_PASSAGE_WORDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.index_dir = index_dir
+        self.passage_words = passage_words
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._loaded = {}
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def get_or_build_document(self, document):
+        """Loads the index for a stored document (anything with a doc_id and iter_pages()) from disk,
+        building it page by page and saving it on first use.
+
+        Passages are read back with index.passage(document, doc_id).
+        """
+        key = hashlib.sha256(f"{INDEX_FORMAT}:{self.passage_words}\0doc:{document.doc_id}".encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._loaded:
+                return self._loaded[key]
+            path = os.path.join(self.index_dir, f"{key}.json")
+            index = None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    index = BM25Index.from_dict(json.load(f))
+                now = time.time()
+                os.utime(path, (now, now))
+            except (OSError, ValueError, KeyError):
+                index = BM25Index.build(iter_passages(document.iter_pages(), self.passage_words))
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(index.to_dict(), f)
+                os.replace(tmp_path, path)
+                self._evict(keep=path)
+            # Keep only the most recently used index in memory
+            self._loaded = {key: index}
+            return index
+
+    def _evict(self, keep):
+        indexes = []
+        for name in os.listdir(self.index_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.index_dir, name)
+                indexes.append((os.path.getmtime(path), os.path.getsize(path), path))
+        total = sum(size for _, size, _ in indexes)
+        for _, size, path in sorted(indexes):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def retrieve_passages(index, document, query, top_k=DEFAULT_TOP_K):
+    """Returns the text of the top_k passages for the query, in document order, read from the indexed document."""
+    hits = index.search(query, top_k)
+    return [index.passage(document, doc_id) for doc_id, _ in sorted(hits)]
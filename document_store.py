@@ -0,0 +1,167 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_DOCUMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "documents")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+class DocumentHandle:
+    """Read-only view of a stored document's pages.
+
+    The page file is memory-mapped on first use and each page is decoded only when it is read, so
+    passing a handle around costs a few page offsets instead of the whole extracted text.
+    """
+
+    def __init__(self, doc_id, pages_path, offsets, char_count):
+        self.doc_id = doc_id
+        self.pages_path = pages_path
+        self.offsets = offsets
+        self.char_count = char_count
+        self._map = None
+        self._lock = threading.Lock()
+
+    @property
+    def page_count(self):
+        return len(self.offsets) - 1
+
+    @property
+    def size_bytes(self):
+        return self.offsets[-1]
+
+    def _view(self):
+        with self._lock:
+            if self._map is None:
+                with open(self.pages_path, "rb") as f:
+                    # mmap cannot map an empty file; such a document only has empty pages
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size_bytes else b""
+            return self._map
+
+    def page(self, index):
+        """Returns the markdown of one page."""
+        return self._view()[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    def iter_pages(self, start=0, stop=None):
+        """Yields page markdown in order, reading one page at a time."""
+        stop = self.page_count if stop is None else min(stop, self.page_count)
+        for index in range(start, stop):
+            yield self.page(index)
+
+    def has_text(self):
+        return any(page.strip() for page in self.iter_pages())
+
+    def close(self):
+        with self._lock:
+            if isinstance(self._map, mmap.mmap):
+                self._map.close()
+            self._map = None
+
+class PageWriter:
+    """Appends pages to a temporary file, then files the finished document under a hash of its pages."""
+
+    def __init__(self, store):
+        self.store = store
+        self.offsets = [0]
+        self.char_count = 0
+        self._digest = hashlib.sha256()
+        self._tmp_path = os.path.join(store.documents_dir, f".{uuid.uuid4().hex}.tmp")
+        self._file = open(self._tmp_path, "wb")
+
+    @property
+    def page_count(self):
+        return len(self.offsets) - 1
+
+    def add(self, markdown):
+        data = markdown.encode("utf-8")
+        # Page lengths go into the hash so the same text split into different pages is a different document
+        self._digest.update(len(data).to_bytes(8, "little"))
+        self._digest.update(data)
+        self._file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+        self.char_count += len(markdown)
+
+    def close(self):
+        """Finishes the document and returns its DocumentHandle."""
+        self._file.close()
+        return self.store._commit(self._tmp_path, self._digest.hexdigest(), self.offsets, self.char_count)
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+class DocumentStore:
+    """Content-addressed, size-bounded store of extracted documents under data/documents/.
+
+    Each document is a file of concatenated page markdown plus a small index of page offsets.
+    Documents are evicted least recently opened first once the store grows past max_bytes.
+    """
+
+    def __init__(self, documents_dir=DEFAULT_DOCUMENTS_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.documents_dir = documents_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.documents_dir, exist_ok=True)
+
+    def _paths(self, doc_id):
+        return (os.path.join(self.documents_dir, f"{doc_id}.pages"),
+                os.path.join(self.documents_dir, f"{doc_id}.json"))
+
+    def writer(self):
+        """Returns a PageWriter for a new document."""
+        return PageWriter(self)
+
+    def open(self, doc_id):
+        """Returns a DocumentHandle for a stored document, or None if it is unknown or was evicted."""
+        if not doc_id or not all(c in "0123456789abcdef" for c in doc_id):
+            return None
+        pages_path, index_path = self._paths(doc_id)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            now = time.time()
+            os.utime(pages_path, (now, now))
+        except (OSError, ValueError):
+            return None
+        return DocumentHandle(doc_id, pages_path, index["offsets"], index["char_count"])
+
+    def _commit(self, tmp_path, doc_id, offsets, char_count):
+        pages_path, index_path = self._paths(doc_id)
+        with self._lock:
+            if os.path.exists(index_path):
+                # Already stored, e.g. the same PDF extracted again; keep the existing copy
+                os.remove(tmp_path)
+                now = time.time()
+                os.utime(pages_path, (now, now))
+            else:
+                os.replace(tmp_path, pages_path)
+                tmp_index_path = index_path + ".tmp"
+                with open(tmp_index_path, "w", encoding="utf-8") as f:
+                    json.dump({"offsets": offsets, "char_count": char_count}, f)
+                os.replace(tmp_index_path, index_path)
+                self._evict(keep=doc_id)
+        return DocumentHandle(doc_id, pages_path, offsets, char_count)
+
+    def _evict(self, keep):
+        documents = []
+        for name in os.listdir(self.documents_dir):
+            if name.endswith(".pages"):
+                path = os.path.join(self.documents_dir, name)
+                documents.append((os.path.getmtime(path), os.path.getsize(path), name[:-len(".pages")]))
+        total = sum(size for _, size, _ in documents)
+        for _, size, doc_id in sorted(documents):
+            if total <= self.max_bytes:
+                break
+            if doc_id == keep:
+                continue
+            total -= size
+            for path in self._paths(doc_id):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
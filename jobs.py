@@ -0,0 +1,372 @@
+import collections
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from llm_cache import get_response_cache
+from pipeline import LocalPDF, PipelineReporter, run_pipeline, get_ocr_cache
+from rate_limiter import get_rate_limiter
+
+DEFAULT_JOBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs")
+# Papers solved at the same time across every session; further jobs wait in the queue
+DEFAULT_MAX_RUNNING_JOBS = 2
+# Jobs allowed to wait before new submissions are turned away
+DEFAULT_MAX_QUEUED_JOBS = 20
+DEFAULT_JOB_TTL_SECONDS = 7 * 24 * 60 * 60
+# Finished jobs are deleted oldest first once data/jobs/ grows past this size
+DEFAULT_MAX_JOBS_BYTES = 1024 * 1024 * 1024
+# How often an idle or finishing worker applies the TTL and size limits
+CLEANUP_INTERVAL_SECONDS = 10 * 60
+# Streamed partial answers are written at most this often per job
+PARTIAL_WRITE_INTERVAL = 1.0
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_DONE, JOB_FAILED)
+INPUT_FILE_NAMES = ("questions.pdf", "context.pdf")
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class JobStore:
+    """Keeps each job's inputs, status, partial answers and result under data/jobs/<job_id>/.
+
+    Everything a session needs to reattach to a job lives on disk; API keys never do.
+    """
+
+    def __init__(self, jobs_dir=DEFAULT_JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        self._lock = threading.Lock()
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def _path(self, job_id, name):
+        return os.path.join(self.jobs_dir, job_id, name)
+
+    def _spool(self, upload, path):
+        upload.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(upload, f)
+
+    def create(self, questions_pdf, context_pdf, settings):
+        """Spools the uploaded PDFs to disk and records a queued job; returns its ID."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.jobs_dir, job_id))
+        try:
+            self._spool(questions_pdf, self._path(job_id, "questions.pdf"))
+            if context_pdf:
+                self._spool(context_pdf, self._path(job_id, "context.pdf"))
+        except OSError:
+            self.delete(job_id)
+            raise
+        _write_json(self._path(job_id, "status.json"), {
+            "id": job_id,
+            "state": JOB_QUEUED,
+            "file_name": questions_pdf.name,
+            "context_file_name": context_pdf.name if context_pdf else None,
+            "settings": settings,
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "messages": {},
+            "progress": {"done": 0, "total": 0},
+            "error": None,
+        })
+        return job_id
+
+    def inputs(self, job_id):
+        """Returns the spooled (questions_pdf, context_pdf) for a job; context_pdf is None when none was uploaded."""
+        status = self.status(job_id)
+        questions_pdf = LocalPDF(self._path(job_id, "questions.pdf"))
+        questions_pdf.name = status["file_name"]
+        context_pdf = None
+        if status["context_file_name"]:
+            context_pdf = LocalPDF(self._path(job_id, "context.pdf"))
+            context_pdf.name = status["context_file_name"]
+        return questions_pdf, context_pdf
+
+    def status(self, job_id):
+        """Returns the job's status dict, or None for an unknown job ID."""
+        if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        return _read_json(self._path(job_id, "status.json"))
+
+    def update(self, job_id, **changes):
+        """Applies changes to the job's status; "messages" and "progress" are merged into the stored dicts."""
+        with self._lock:
+            status = self.status(job_id)
+            if status is None:
+                return
+            for key, value in changes.items():
+                if key in ("messages", "progress"):
+                    status[key].update(value)
+                else:
+                    status[key] = value
+            _write_json(self._path(job_id, "status.json"), status)
+
+    def write_partial(self, job_id, questions, answers):
+        _write_json(self._path(job_id, "partial.json"), {"questions": questions, "answers": answers})
+
+    def partial(self, job_id):
+        """Returns {"questions": [...], "answers": [...]} with the answers streamed so far, or None."""
+        return _read_json(self._path(job_id, "partial.json"))
+
+    def write_result(self, job_id, state, service_stats=None):
+        """Stores the finished run; service_stats holds process-wide cache and rate limiter figures at the time."""
+        trace = state.get("trace")
+        _write_json(self._path(job_id, "result.json"), {
+            # Extracted text stays in the document store; the result only refers to it
+            "questions_document": state["questions_document"].doc_id,
+            "context_document": state["context_document"].doc_id if state.get("context_document") else None,
+            "context_error": state.get("context_error"),
+            "generated_answers": state["generated_answers"],
+            "run_report": state.get("run_report"),
+            "stage_seconds": state.get("stage_seconds"),
+            "trace_summary": trace.summary() if trace else {},
+            "trace_counters": dict(trace.counters) if trace else {},
+            "service_stats": service_stats or {},
+        })
+        if trace:
+            with open(self._path(job_id, "trace.json"), "w", encoding="utf-8") as f:
+                f.write(trace.to_chrome_trace())
+            with open(self._path(job_id, "metrics.prom"), "w", encoding="utf-8") as f:
+                f.write(trace.to_prometheus())
+
+    def result(self, job_id):
+        return _read_json(self._path(job_id, "result.json"))
+
+    def read_text(self, job_id, name):
+        """Returns the text of a file in the job's directory (e.g. trace.json or metrics.prom), or None."""
+        try:
+            with open(self._path(job_id, name), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def job_ids(self):
+        return [name for name in os.listdir(self.jobs_dir) if os.path.isdir(os.path.join(self.jobs_dir, name))]
+
+    def size(self, job_id):
+        """Returns the bytes used by the job's directory."""
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        total = 0
+        for name in os.listdir(job_dir):
+            try:
+                total += os.path.getsize(os.path.join(job_dir, name))
+            except OSError:
+                pass
+        return total
+
+    def delete_inputs(self, job_id):
+        """Removes a job's spooled PDFs; its result refers to the extracted text in the document store instead."""
+        for name in INPUT_FILE_NAMES:
+            try:
+                os.remove(self._path(job_id, name))
+            except OSError:
+                pass
+
+    def delete(self, job_id):
+        shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+
+class JobReporter(PipelineReporter):
+    """Writes a running job's solve progress and streamed answers to the job store."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.questions = []
+        self.answers = []
+        self._last_write = 0.0
+
+    def solve_started(self, questions, has_context):
+        self.questions = [question["number"] for question in questions]
+        self.answers = [""] * len(questions)
+        self.store.update(self.job_id, progress={"done": 0, "total": len(questions)},
+                          messages={"Solver": f"Solving {len(questions)} question(s)..."})
+        self.store.write_partial(self.job_id, self.questions, self.answers)
+
+    def solve_progress(self, done, total):
+        self.store.update(self.job_id, progress={"done": done, "total": total},
+                          messages={"Solver": f"Solved {done} of {total} question(s)"})
+
+    def question_chunk(self, index, partial_text):
+        self.answers[index] = partial_text
+        now = time.monotonic()
+        if now - self._last_write >= PARTIAL_WRITE_INTERVAL:
+            self._last_write = now
+            self.store.write_partial(self.job_id, self.questions, self.answers)
+
+    def solve_finished(self, questions, answers, failed):
+        self.store.write_partial(self.job_id, self.questions, list(answers))
+
+class JobManager:
+    """Runs solve jobs on a fixed pool of worker threads shared by every Streamlit session.
+
+    At most max_running papers are solved at once so a burst of users cannot overrun the API
+    quotas; other jobs wait in a FIFO queue of at most max_queued entries.
+    """
+
+    def __init__(self, store=None, max_running=DEFAULT_MAX_RUNNING_JOBS, max_queued=DEFAULT_MAX_QUEUED_JOBS,
+                 ttl_seconds=DEFAULT_JOB_TTL_SECONDS, max_bytes=DEFAULT_MAX_JOBS_BYTES):
+        self.store = store or JobStore()
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._pending = collections.deque()
+        # Submissions admitted to the queue whose uploads are still being spooled to disk
+        self._spooling = 0
+        # API keys of queued jobs, kept in memory only
+        self._credentials = {}
+        self._condition = threading.Condition()
+        self._cleanup_lock = threading.Lock()
+        self._last_cleanup = 0.0
+        self._recover()
+        self._workers = [
+            threading.Thread(target=self._run_worker, name=f"jee-job-worker-{i}", daemon=True)
+            for i in range(max(1, max_running))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _recover(self):
+        """Fails jobs a previous process left unfinished, then applies the TTL and size limits."""
+        now = time.time()
+        for job_id in self.store.job_ids():
+            status = self.store.status(job_id)
+            if status is None:
+                # Left half-written by a crash while its uploads were being spooled
+                self.store.delete(job_id)
+            elif status["state"] not in FINISHED_STATES:
+                self.store.update(job_id, state=JOB_FAILED, finished=now,
+                                  error="The server restarted before this job finished. Please submit the paper again.")
+                self.store.delete_inputs(job_id)
+        self._clean_up()
+
+    def _clean_up(self):
+        """Deletes finished jobs past their TTL, then the oldest finished jobs while the store is over max_bytes."""
+        now = time.time()
+        finished = []
+        total = 0
+        for job_id in self.store.job_ids():
+            status = self.store.status(job_id)
+            # Queued and running jobs are never removed; a job without a status is still being spooled
+            if status is None or status["state"] not in FINISHED_STATES:
+                total += self.store.size(job_id)
+                continue
+            if now - status["created"] > self.ttl_seconds:
+                self.store.delete(job_id)
+                continue
+            size = self.store.size(job_id)
+            total += size
+            finished.append((status["finished"] or status["created"], size, job_id))
+        for _, size, job_id in sorted(finished):
+            if total <= self.max_bytes:
+                break
+            self.store.delete(job_id)
+            total -= size
+
+    def _clean_up_if_due(self):
+        # Only one worker cleans up at a time; the others go straight back to the queue
+        if not self._cleanup_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self._last_cleanup >= CLEANUP_INTERVAL_SECONDS:
+                self._last_cleanup = time.monotonic()
+                self._clean_up()
+        finally:
+            self._cleanup_lock.release()
+
+    def submit(self, questions_pdf, context_pdf, api_key, mistral_api_key, settings):
+        """Queues a solve job and returns (job_id, error); error is set when the queue is full."""
+        with self._condition:
+            if len(self._pending) + self._spooling >= self.max_queued:
+                return None, "Error: The solver is busy with other papers. Please try again in a few minutes."
+            self._spooling += 1
+        # Spooling a large upload takes a while; polling sessions must not wait for it on the lock
+        job_id = None
+        try:
+            job_id = self.store.create(questions_pdf, context_pdf, settings)
+        except OSError as e:
+            return None, f"Error: Could not save the uploaded PDFs: {e}"
+        finally:
+            with self._condition:
+                self._spooling -= 1
+                if job_id:
+                    self._credentials[job_id] = (api_key, mistral_api_key)
+                    self._pending.append(job_id)
+                    self._condition.notify()
+        return job_id, None
+
+    def queue_position(self, job_id):
+        """Returns the 1-based position of a queued job, or None once it has started."""
+        with self._condition:
+            try:
+                return self._pending.index(job_id) + 1
+            except ValueError:
+                return None
+
+    def _run_worker(self):
+        while True:
+            self._clean_up_if_due()
+            with self._condition:
+                if not self._pending:
+                    self._condition.wait(timeout=CLEANUP_INTERVAL_SECONDS)
+                    continue
+                job_id = self._pending.popleft()
+                api_key, mistral_api_key = self._credentials.pop(job_id)
+            self._run_job(job_id, api_key, mistral_api_key)
+
+    def _run_job(self, job_id, api_key, mistral_api_key):
+        store = self.store
+        store.update(job_id, state=JOB_RUNNING, started=time.time())
+        status = store.status(job_id)
+        settings = status["settings"]
+        try:
+            questions_pdf, context_pdf = store.inputs(job_id)
+            state, error = run_pipeline(
+                questions_pdf, context_pdf, api_key, mistral_api_key,
+                max_workers=settings["max_workers"],
+                top_k_passages=settings["top_k_passages"],
+                prompt_token_budget=settings["prompt_token_budget"],
+                stream_output=settings["stream_output"],
+                reporter=JobReporter(store, job_id),
+                on_ingest_progress=lambda label, message: store.update(job_id, messages={label: message}),
+                # Re-uploads of a paper under the same file name reuse the answers to unchanged questions
+                paper_key=status["file_name"] if settings.get("reuse_solutions") else None,
+            )
+            if error is None:
+                store.write_result(job_id, state, service_stats={
+                    "ocr_cache": get_ocr_cache().stats(),
+                    "response_cache": get_response_cache().stats(),
+                    "rate_limiter": get_rate_limiter(api_key).metrics(),
+                })
+        except Exception as e:
+            error = f"An error occurred: {e}"
+        store.update(job_id, state=JOB_FAILED if error else JOB_DONE, finished=time.time(), error=error)
+        # The uploads are not needed once the job has finished
+        store.delete_inputs(job_id)
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """Returns the process-wide job manager, whose workers outlive Streamlit reruns and sessions."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+        return _job_manager
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_cache")
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MEMORY_ENTRIES = 512
+
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text):
+    """Collapses whitespace so OCR and formatting noise does not change the cache key."""
+    return WHITESPACE.sub(" ", text).strip()
+
+def is_cacheable_response(response):
+    """Error responses and empty responses are never cached."""
+    return bool(response) and not response.startswith("Error:")
+
+class ResponseCache:
+    """Two-tier cache of LLM responses: an in-memory LRU hot tier in front of an on-disk tier.
+
+    Keys are hashes of the model name and the normalized prompt, which already contains the
+    question text and its retrieved context passages. Entries expire after ttl_seconds and the
+    disk tier evicts least recently used responses beyond max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_bytes=DEFAULT_MAX_BYTES, memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # key -> [size, last_access]; last access is persisted as the file's mtime
+        self._disk = {}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.cache_dir, name)
+                self._disk[name[:-len(".json")]] = [os.path.getsize(path), os.path.getmtime(path)]
+
+    @staticmethod
+    def make_key(model, prompt):
+        digest = hashlib.sha256()
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(normalize_text(prompt).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key, created, response):
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _drop(self, key):
+        self._memory.pop(key, None)
+        if self._disk.pop(key, None) is not None:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get(self, key):
+        """Returns the cached response, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, response = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return response
+                self._drop(key)
+            if key not in self._disk:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                self._drop(key)
+                self.misses += 1
+                return None
+            if now - data["created"] > self.ttl_seconds:
+                self._drop(key)
+                self.misses += 1
+                return None
+            try:
+                os.utime(self._path(key), (now, now))
+            except OSError:
+                pass
+            self._disk[key][1] = now
+            self._remember(key, data["created"], data["response"])
+            self.hits += 1
+            return data["response"]
+
+    def put(self, key, response, model=""):
+        """Stores a successful response in both tiers; error responses are ignored."""
+        if not is_cacheable_response(response):
+            return
+        created = time.time()
+        payload = json.dumps({"created": created, "model": model, "response": response}).encode("utf-8")
+        with self._lock:
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            self._disk[key] = [len(payload), created]
+            self._remember(key, created, response)
+            self._evict()
+
+    def _evict(self):
+        total = sum(size for size, _ in self._disk.values())
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self._disk, key=lambda k: self._disk[k][1]):
+            if total <= self.max_bytes:
+                break
+            total -= self._disk[key][0]
+            self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "misses": self.misses,
+                "entries": len(self._disk),
+                "bytes": sum(size for size, _ in self._disk.values()),
+            }
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Returns the process-wide response cache, shared by every session and worker thread."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+OCR_MODEL = "mistral-ocr-latest"
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ocr_cache")
+DEFAULT_MAX_ENTRIES = 100_000
+
+class OCRCache:
+    """Content-addressed LRU map from a PDF's hash to the stored document holding its OCR output.
+
+    The page markdown itself lives in the document store, so each entry is just a document ID;
+    an entry whose document has since been evicted from the store counts as a miss.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._index_path = os.path.join(self.cache_dir, "index.json")
+        self._index = self._load_index()
+
+    @staticmethod
+    def make_key(pdf_bytes, model=OCR_MODEL):
+        """Hashes the PDF bytes together with the OCR model name."""
+        digest = hashlib.sha256()
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(pdf_bytes)
+        return digest.hexdigest()
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        # Earlier versions stored every document's pages here as <key>.json; the document store holds them now
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json") and name != "index.json":
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        return {key: meta for key, meta in index.items() if isinstance(meta, dict) and meta.get("doc_id")}
+
+    def _save_index(self):
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def get(self, key):
+        """Returns the document ID recorded for a PDF, or None on a miss."""
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None:
+                self.misses += 1
+                return None
+            # Access times are only persisted with the next put; rewriting the index on every hit is too slow
+            meta["last_access"] = time.time()
+            self.hits += 1
+            return meta["doc_id"]
+
+    def miss(self, key):
+        """Drops an entry whose document is no longer stored, turning the lookup into a miss."""
+        with self._lock:
+            if self._index.pop(key, None) is not None:
+                self.hits -= 1
+                self.misses += 1
+                self._save_index()
+
+    def put(self, key, doc_id, model=OCR_MODEL):
+        """Records the document holding a PDF's pages and evicts least recently used entries over the limit."""
+        with self._lock:
+            self._index[key] = {"doc_id": doc_id, "model": model, "last_access": time.time()}
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        excess = len(self._index) - self.max_entries
+        if excess > 0:
+            for key in sorted(self._index, key=lambda k: self._index[k]["last_access"])[:excess]:
+                del self._index[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._index),
+            }
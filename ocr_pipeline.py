@@ -0,0 +1,208 @@
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from ocr_cache import OCR_MODEL
+from tracing import span, propagate
+
+DEFAULT_PAGES_PER_RANGE = 8
+DEFAULT_OCR_CONCURRENCY = 4
+DEFAULT_OCR_REQUESTS_PER_SECOND = 4.0
+DEFAULT_OCR_RETRIES = 3
+
+PAGE_OBJECT = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+PAGE_TREE_NODE = re.compile(rb"/Type\s*/Pages(?![a-zA-Z])")
+PAGE_TREE_COUNT = re.compile(rb"/Count\s+(\d+)")
+# "Status 422" in SDK error messages, or a bare "400 Bad Request"
+ERROR_STATUS = re.compile(r"(?:^|\bstatus\b\W*)([1-5]\d\d)\b", re.IGNORECASE)
+# Statuses the OCR service answers a request for pages the document does not have with
+PAGE_RANGE_REJECTED_STATUSES = (400, 422)
+# Client errors that can succeed when simply tried again
+RETRYABLE_CLIENT_STATUSES = (408, 429)
+
+def count_pdf_pages(pdf_bytes):
+    """Estimates the page count of a PDF from its raw bytes, or returns None if it cannot be determined.
+
+    The root of the page tree carries the largest /Count of any /Type /Pages object, which is
+    preferred; outline (bookmark) objects also have a /Count and are ignored. Counting page
+    objects is the fallback and can overcount PDFs saved with incremental updates.
+    """
+    tree_counts = []
+    for node in PAGE_TREE_NODE.finditer(pdf_bytes):
+        # Only look inside the object holding this /Type entry
+        begin = max(pdf_bytes.rfind(b"obj", 0, node.start()), 0)
+        end = pdf_bytes.find(b"endobj", node.end())
+        count = PAGE_TREE_COUNT.search(pdf_bytes[begin:end if end >= 0 else len(pdf_bytes)])
+        if count:
+            tree_counts.append(int(count.group(1)))
+    page_count = max(tree_counts) if tree_counts else len(PAGE_OBJECT.findall(pdf_bytes))
+    return page_count or None
+
+def error_status(error):
+    """Returns the HTTP status of an SDK error, from its attributes or its message, or None."""
+    status = getattr(error, "status_code", None) or getattr(error, "http_status", None)
+    if status is None:
+        match = ERROR_STATUS.search(str(error))
+        status = int(match.group(1)) if match else None
+    return status if isinstance(status, int) else None
+def page_ranges(page_count, pages_per_range=DEFAULT_PAGES_PER_RANGE):
+    """Splits [0, page_count) into consecutive lists of page indices."""
+    pages_per_range = max(1, pages_per_range)
+    return [list(range(start, min(start + pages_per_range, page_count))) for start in range(0, page_count, pages_per_range)]
+
+class RequestPacer:
+    """Spaces out request starts so no more than requests_per_second are issued."""
+
+    def __init__(self, requests_per_second=DEFAULT_OCR_REQUESTS_PER_SECOND):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+class DocumentEnd:
+    """Lowest page index known to be past the end of the document, shared by the range workers."""
+
+    def __init__(self, estimate):
+        self._lock = threading.Lock()
+        self.index = estimate
+
+    def found(self, index):
+        with self._lock:
+            self.index = min(self.index, index)
+
+class PageRangeRejected(RuntimeError):
+    """Raised when the OCR service rejects a page range outright, e.g. because it is past the end of the document."""
+
+def _process_pages(client, document_url, pages, pacer, max_retries, attrs):
+    """OCRs the given page indices (or the whole document when pages is None) with jittered backoff.
+
+    Returns {page_index: markdown}. Raises PageRangeRejected when the service rejects the pages as
+    invalid, RuntimeError right away on other client errors (such as an expired signed URL), and
+    RuntimeError once max_retries attempts have failed. Neither kind of client error is retried.
+    """
+    label = f"pages {pages[0] + 1}-{pages[-1] + 1}" if pages else "document"
+    request = {"pages": pages} if pages is not None else {}
+    for attempt in range(max_retries):
+        pacer.wait()
+        try:
+            ocr_response = client.ocr.process(
+                model=OCR_MODEL,
+                document={"type": "document_url", "document_url": document_url},
+                include_image_base64=False,
+                **request
+            )
+        except Exception as e:
+            status = error_status(e)
+            if status in PAGE_RANGE_REJECTED_STATUSES:
+                raise PageRangeRejected(f"{label}: {e}") from e
+            if status is not None and 400 <= status < 500 and status not in RETRYABLE_CLIENT_STATUSES:
+                raise RuntimeError(f"{label}: {e}") from e
+            if attempt == max_retries - 1:
+                raise RuntimeError(f"{label}: {e}") from e
+            delay = 2 ** attempt + random.uniform(0, 1)
+            attrs["retries"] += 1
+            attrs["backoff_seconds"] += delay
+            time.sleep(delay)
+            continue
+        results = ocr_response.pages if hasattr(ocr_response, "pages") else []
+        first = pages[0] if pages else 0
+        markdown = {}
+        for offset, page in enumerate(results):
+            index = page.index if getattr(page, "index", None) is not None else first + offset
+            markdown[index] = page.markdown
+        return markdown
+
+def _ocr_range(client, document_url, pages, pacer, max_retries, document_end):
+    """OCRs one page range, retrying it on its own with jittered backoff.
+
+    Returns {page_index: markdown}. The page count is only an estimate, so a range the service
+    rejects is retried page by page to find where the document ends, which is recorded in
+    document_end; ranges past an end already found by another range are skipped.
+    """
+    with span("ocr_range", pages=len(pages), retries=0, backoff_seconds=0.0) as attrs:
+        if pages[0] >= document_end.index:
+            attrs["skipped"] = True
+            return {}
+        try:
+            markdown = _process_pages(client, document_url, pages, pacer, max_retries, attrs)
+        except PageRangeRejected:
+            markdown = {}
+            for index in pages:
+                if index >= document_end.index:
+                    return markdown
+                try:
+                    markdown.update(_process_pages(client, document_url, [index], pacer, max_retries, attrs))
+                except PageRangeRejected:
+                    if index == 0:
+                        # The first page always exists, so this is a real error (e.g. a bad key or URL)
+                        raise
+                    attrs["end"] = index
+                    document_end.found(index)
+                    return markdown
+        attrs["markdown_chars"] = sum(len(text) for text in markdown.values())
+        # A short or empty answer also means the document ended inside this range
+        if pages[-1] not in markdown:
+            attrs["end"] = max(markdown) + 1 if markdown else pages[0]
+            document_end.found(attrs["end"])
+        return markdown
+
+def iter_ocr_pages(client, document_url, page_count,
+                   pages_per_range=DEFAULT_PAGES_PER_RANGE,
+                   max_concurrency=DEFAULT_OCR_CONCURRENCY,
+                   requests_per_second=DEFAULT_OCR_REQUESTS_PER_SECOND,
+                   max_retries=DEFAULT_OCR_RETRIES):
+    """Yields (page_index, markdown) in page order while page ranges are OCR'd concurrently.
+
+    A page is yielded as soon as it and every page before it are done, so downstream stages can
+    start on the first pages while later ranges are still being processed. When the page count
+    is unknown the whole document is processed in a single call. The page count is treated as an
+    estimate: pages the service rejects or leaves out past the real end of the document just end
+    the output. Raises RuntimeError if a range still fails after max_retries attempts.
+    """
+    pacer = RequestPacer(requests_per_second)
+    if not page_count:
+        with span("ocr_range", retries=0, backoff_seconds=0.0) as attrs:
+            markdown = _process_pages(client, document_url, None, pacer, max_retries, attrs)
+            attrs["pages"] = len(markdown)
+        for index in sorted(markdown):
+            yield index, markdown[index]
+        return
+
+    ranges = page_ranges(page_count, pages_per_range)
+    done = {}
+    next_page = 0
+    document_end = DocumentEnd(page_count)
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        pending = {pool.submit(propagate(_ocr_range), client, document_url, pages, pacer, max_retries, document_end): pages for pages in ranges}
+        try:
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pages = pending.pop(future)
+                    try:
+                        done.update(future.result())
+                    except Exception:
+                        if pages[0] >= document_end.index:
+                            # Past the end found by another range; the estimate was too high
+                            continue
+                        raise
+                end = document_end.index
+                while next_page < end and next_page in done:
+                    yield next_page, done.pop(next_page)
+                    next_page += 1
+        finally:
+            for future in pending:
+                future.cancel()
+    # Flush pages the OCR service skipped over before the end of the document
+    for index in sorted(done):
+        if index < document_end.index:
+            yield index, done[index]
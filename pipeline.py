@@ -0,0 +1,863 @@
+"""Headless JEE solving pipeline: OCR ingestion, question segmentation, context retrieval and the LangGraph agents.
+
+Nothing in this module touches Streamlit, so it is shared by the Streamlit app and the batch CLI.
+UI updates are delivered through a PipelineReporter passed in the graph state.
+"""
+import io
+import mmap
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TypedDict
+
+from langgraph.graph import StateGraph
+
+from resources import get_mistral_client, get_gemini_model, GEMINI_MODEL
+from ocr_cache import OCRCache
+from ocr_pipeline import iter_ocr_pages, count_pdf_pages
+from rate_limiter import (
+    get_rate_limiter, run_with_backoff, backoff_delay, estimate_tokens, is_rate_limit_error, RateLimitTimeout,
+    DEFAULT_MAX_ATTEMPTS, DEFAULT_DEADLINE_SECONDS, DEFAULT_OUTPUT_TOKENS_ESTIMATE,
+)
+from llm_cache import get_response_cache
+from tracing import span, add_counter, propagate, traced_run
+from question_segmenter import iter_questions
+from solution_store import SolutionStore, question_fingerprint, SOLUTION_SEPARATOR
+from context_retrieval import ContextIndexStore, DEFAULT_TOP_K
+from document_store import DocumentStore
+from planner import (
+    plan_questions, summarize_plan, MODE_DIRECT, MODE_TWO_STAGE,
+    DEFAULT_PROMPT_TOKEN_BUDGET, DEFAULT_ANALYSIS_TOKENS,
+)
+
+# Default number of questions solved in parallel, and how many times a failed question is retried on its own
+DEFAULT_SOLVER_WORKERS = 4
+DEFAULT_QUESTION_RETRIES = 3
+
+class PipelineReporter:
+    """Receives progress from the solve stage. The base class ignores everything, which is what headless runs use.
+    
+    Methods are always called on the thread that invoked the graph.
+    """
+    
+    def solve_started(self, questions, has_context):
+        pass
+    
+    def solve_progress(self, done, total):
+        pass
+    
+    def question_chunk(self, index, partial_text):
+        pass
+    
+    def solve_finished(self, questions, answers, failed):
+        pass
+
+class LocalPDF:
+    """A PDF on disk exposing the same name/getvalue() interface as a Streamlit upload."""
+    
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+    
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+    
+    def getvalue(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+# Function to open a PDF as a binary stream, read from disk for spooled files instead of loaded into memory
+def open_pdf(uploaded_file):
+    if isinstance(uploaded_file, LocalPDF):
+        return open(uploaded_file.path, "rb")
+    return io.BytesIO(uploaded_file.getvalue())
+
+@contextmanager
+def pdf_view(uploaded_file):
+    """Yields the PDF's bytes; spooled files are memory-mapped so they are paged in on demand rather than copied."""
+    if not isinstance(uploaded_file, LocalPDF) or not uploaded_file.size:
+        yield uploaded_file.getvalue()
+        return
+    with open(uploaded_file.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        yield view
+
+# Function to check whether an extracted context document can be used
+def context_available(context_document):
+    return context_document is not None and context_document.has_text()
+
+# Define State Schema
+class GraphState(TypedDict):
+    api_key: str
+    # Extracted PDFs are passed as DocumentHandles over the on-disk page store, not as joined text
+    questions_document: object
+    context_document: object
+    questions: list
+    context_passages: list
+    top_k_passages: int
+    stream_output: bool
+    relevance_analysis: str
+    max_workers: int
+    max_question_retries: int
+    context_scores: list
+    prompt_token_budget: int
+    plan: list
+    question_analyses: list
+    analysis_prompt_tokens: int
+    stage_seconds: dict
+    run_report: dict
+    generated_answers: dict
+    reporter: PipelineReporter
+    paper_key: str
+    fingerprints: list
+    reused_answers: list
+
+# Function to upload PDF to Mistral OCR and get signed URL
+def upload_pdf_to_mistral(uploaded_file, api_key):
+    client = get_mistral_client(api_key)
+    with span("upload_pdf", file_name=uploaded_file.name, bytes=uploaded_file.size):
+        try:
+            with open_pdf(uploaded_file) as content:
+                uploaded_pdf = client.files.upload(
+                    file={
+                        "file_name": uploaded_file.name,
+                        "content": content,
+                    },
+                    purpose="ocr"
+                )
+            file_id = uploaded_pdf.id
+            if not file_id:
+                return None, "Error: Failed to get file_id from Mistral OCR response."
+            
+            signed_url = client.files.get_signed_url(file_id=file_id)
+            return signed_url.url, None
+        except Exception as e:
+            return None, f"Error uploading PDF: {e}"
+
+# Function to extract per-page markdown from PDFs using Mistral OCR
+def extract_pages_from_pdf_mistral(document_url, api_key, page_count=None):
+    """Yields page markdown in order while page ranges are OCR'd concurrently; raises RuntimeError on failure."""
+    if not document_url:
+        raise RuntimeError("Error: No valid document URL provided.")
+    
+    client = get_mistral_client(api_key)
+    try:
+        for _, markdown in iter_ocr_pages(client, document_url, page_count):
+            yield markdown
+    except Exception as e:
+        raise RuntimeError(f"Error extracting text: {e}") from e
+
+_ocr_cache = None
+_context_index_store = None
+_solution_store = None
+_document_store = None
+_executor = None
+_singletons_lock = threading.Lock()
+
+def get_ocr_cache():
+    """Shared OCR cache, kept alive for the life of the process."""
+    global _ocr_cache
+    with _singletons_lock:
+        if _ocr_cache is None:
+            _ocr_cache = OCRCache()
+        return _ocr_cache
+
+def get_context_index_store():
+    """Shared store of BM25 indexes over context material, kept alive for the life of the process."""
+    global _context_index_store
+    with _singletons_lock:
+        if _context_index_store is None:
+            _context_index_store = ContextIndexStore()
+        return _context_index_store
+
+def get_solution_store():
+    """Shared store of each paper's last solved answers, kept alive for the life of the process."""
+    global _solution_store
+    with _singletons_lock:
+        if _solution_store is None:
+            _solution_store = SolutionStore()
+        return _solution_store
+
+def get_document_store():
+    """Shared on-disk store of extracted page markdown, kept alive for the life of the process."""
+    global _document_store
+    with _singletons_lock:
+        if _document_store is None:
+            _document_store = DocumentStore()
+        return _document_store
+
+# Function to upload a PDF to Mistral and OCR it page by page
+def iter_pdf_pages(uploaded_file, api_key, on_progress=None):
+    """Yields page markdown in order as soon as each page is OCR'd."""
+    if on_progress:
+        on_progress("⬆️ Uploading to Mistral OCR...")
+    document_url, upload_error = upload_pdf_to_mistral(uploaded_file, api_key)
+    if upload_error:
+        raise RuntimeError(upload_error)
+    if on_progress:
+        on_progress("🔍 Extracting text using Mistral OCR...")
+    with pdf_view(uploaded_file) as pdf_bytes:
+        page_count = count_pdf_pages(pdf_bytes)
+    yield from extract_pages_from_pdf_mistral(document_url, api_key, page_count)
+
+# Function to find the stored pages of a PDF that was processed before, so upload and OCR can be skipped
+def find_cached_document(uploaded_file, ocr_cache):
+    """Returns (cache_key, document); document is None unless the same PDF was OCR'd before and its pages are still stored."""
+    with pdf_view(uploaded_file) as pdf_bytes:
+        cache_key = ocr_cache.make_key(pdf_bytes)
+    doc_id = ocr_cache.get(cache_key)
+    document = get_document_store().open(doc_id) if doc_id else None
+    if doc_id and document is None:
+        # The document store evicted the pages since
+        ocr_cache.miss(cache_key)
+    add_counter("ocr_cache_hits" if document is not None else "ocr_cache_misses")
+    return cache_key, document
+
+# Function to OCR one PDF without touching the UI, so it can run on a worker thread
+def ingest_pdf(uploaded_file, api_key, ocr_cache, segment_questions=False, on_progress=None):
+    """Returns (document, questions, error); questions is None unless segment_questions is set.
+    
+    Pages are written to the document store as they arrive and the returned DocumentHandle reads
+    them back lazily. A PDF that was processed before is served from the store without another
+    copy. With segment_questions, questions are split out while later pages are still being OCR'd.
+    """
+    questions = None
+    document = None
+    writer = None
+    
+    def track(page_iter):
+        for markdown in page_iter:
+            writer.add(markdown)
+            if on_progress:
+                on_progress(f"📄 {writer.page_count} page(s) extracted")
+            yield markdown
+    
+    with span("ingest_pdf", file_name=uploaded_file.name) as attrs:
+        try:
+            cache_key, document = find_cached_document(uploaded_file, ocr_cache)
+            if document is not None:
+                if on_progress:
+                    on_progress("♻️ Reused cached OCR output")
+                if segment_questions:
+                    questions = list(iter_questions(document.iter_pages()))
+            else:
+                writer = get_document_store().writer()
+                page_iter = track(iter_pdf_pages(uploaded_file, api_key, on_progress))
+                if segment_questions:
+                    questions = list(iter_questions(page_iter))
+                else:
+                    for _ in page_iter:
+                        pass
+                document = writer.close()
+                if document.page_count:
+                    ocr_cache.put(cache_key, document.doc_id)
+        except RuntimeError as e:
+            attrs["error"] = str(e)
+            return None, None, str(e)
+        finally:
+            if document is not None:
+                attrs["pages"] = document.page_count
+                attrs["markdown_chars"] = document.char_count
+            elif writer is not None:
+                attrs["pages"] = writer.page_count
+                attrs["markdown_chars"] = writer.char_count
+                writer.discard()
+    return document, questions, None
+
+# Function to OCR the questions and context PDFs at the same time, reporting progress for each
+def ingest_pdfs_concurrently(documents, api_key, on_progress=None):
+    """Takes {label: (uploaded_file, segment_questions)} and returns {label: (document, questions, error)}.
+    
+    Uploads and OCR run on worker threads; on_progress(label, message) is called from this thread
+    so callers can safely update UI elements that belong to it.
+    """
+    ocr_cache = get_ocr_cache()
+    events = queue.Queue()
+    with ThreadPoolExecutor(max_workers=max(1, len(documents))) as pool:
+        futures = {
+            label: pool.submit(propagate(ingest_pdf), uploaded_file, api_key, ocr_cache, segment,
+                               lambda message, label=label: events.put((label, message)))
+            for label, (uploaded_file, segment) in documents.items()
+        }
+        while not all(future.done() for future in futures.values()) or not events.empty():
+            try:
+                label, message = events.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if on_progress:
+                on_progress(label, message)
+    return {label: future.result() for label, future in futures.items()}
+
+# Function to copy Gemini's reported token usage onto a trace span, estimating it when the response has none
+def record_usage(attrs, usage, text):
+    attrs["prompt_tokens"] = getattr(usage, "prompt_token_count", None) or attrs["prompt_tokens"]
+    attrs["response_tokens"] = getattr(usage, "candidates_token_count", None) or estimate_tokens(text)
+
+def call_gemini_with_retry(prompt, api_key, max_retries=DEFAULT_MAX_ATTEMPTS):
+    """Calls Gemini under the shared per-key rate limiter, backing off and retrying on quota errors.
+    
+    Successful responses are memoized by model and normalized prompt, so an identical prompt is answered from the cache.
+    """
+    with span("gemini_call", prompt_tokens=estimate_tokens(prompt), response_tokens=0, cache_hit=False,
+              retries=0, backoff_seconds=0.0) as attrs:
+        response_cache = get_response_cache()
+        cache_key = response_cache.make_key(GEMINI_MODEL, prompt)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            attrs["cache_hit"] = True
+            return cached
+        
+        def on_retry(delay):
+            attrs["retries"] += 1
+            attrs["backoff_seconds"] += delay
+        
+        model = get_gemini_model(api_key)
+        limiter = get_rate_limiter(api_key)
+        reserved_tokens = estimate_tokens(prompt) + DEFAULT_OUTPUT_TOKENS_ESTIMATE
+        try:
+            response = run_with_backoff(lambda: model.generate_content(prompt), limiter, reserved_tokens,
+                                        max_attempts=max_retries, on_retry=on_retry)
+        except Exception as e:
+            attrs["error"] = str(e)
+            return f"Error: {str(e)}"
+        usage = getattr(response, "usage_metadata", None)
+        limiter.record_success(reserved_tokens, getattr(usage, "total_token_count", None))
+        try:
+            # Raises ValueError when the candidate was blocked by the safety filters or is empty
+            text = response.text if hasattr(response, "text") else ""
+        except Exception as e:
+            attrs["error"] = str(e)
+            return f"Error: {str(e)}"
+        record_usage(attrs, usage, text)
+        response_cache.put(cache_key, text, model=GEMINI_MODEL)
+        return text
+
+def stream_gemini_with_retry(prompt, api_key, max_retries=DEFAULT_MAX_ATTEMPTS):
+    """Streams Gemini output chunk by chunk under the shared rate limiter, retrying quota errors before any text arrives.
+    
+    A cached response for the same prompt is yielded as a single chunk; a fully streamed response is added to the cache.
+    """
+    started = time.perf_counter()
+    with span("gemini_stream", prompt_tokens=estimate_tokens(prompt), response_tokens=0, cache_hit=False,
+              retries=0, backoff_seconds=0.0) as attrs:
+        response_cache = get_response_cache()
+        cache_key = response_cache.make_key(GEMINI_MODEL, prompt)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            attrs["cache_hit"] = True
+            yield cached
+            return
+        
+        model = get_gemini_model(api_key)
+        limiter = get_rate_limiter(api_key)
+        reserved_tokens = estimate_tokens(prompt) + DEFAULT_OUTPUT_TOKENS_ESTIMATE
+        deadline = time.monotonic() + DEFAULT_DEADLINE_SECONDS
+        for attempt in range(max_retries):
+            limiter.acquire(reserved_tokens, deadline)
+            chunks = []
+            try:
+                response = model.generate_content(prompt, stream=True)
+                for chunk in response:
+                    text = chunk.text if hasattr(chunk, "text") else ""
+                    if text:
+                        if not chunks:
+                            attrs["first_chunk_seconds"] = time.perf_counter() - started
+                        chunks.append(text)
+                        yield text
+                usage = getattr(response, "usage_metadata", None)
+                limiter.record_success(reserved_tokens, getattr(usage, "total_token_count", None))
+                record_usage(attrs, usage, "".join(chunks))
+                response_cache.put(cache_key, "".join(chunks), model=GEMINI_MODEL)
+                return
+            except Exception as e:
+                if chunks or not is_rate_limit_error(e):
+                    attrs["error"] = str(e)
+                    raise
+                limiter.record_throttle()
+                wait_time = backoff_delay(attempt)
+                if attempt == max_retries - 1 or time.monotonic() + wait_time > deadline:
+                    break
+                limiter.record_retry(wait_time)
+                attrs["retries"] += 1
+                attrs["backoff_seconds"] += wait_time
+                time.sleep(wait_time)
+        attrs["error"] = "rate limit timeout"
+        raise RateLimitTimeout("API quota exceeded. Please try again later.")
+
+# Agent: Run the relevance pass for questions whose context is too large to solve in a single call
+def analyze_context_relevance(state: GraphState) -> GraphState:
+    """Pre-analyzes the retrieved context passages of every question the planner marked as two-stage."""
+    plan = state.get("plan") or []
+    questions = state["questions"]
+    reused = state.get("reused_answers") or [None] * len(plan)
+    two_stage = [i for i, entry in enumerate(plan) if entry["mode"] == MODE_TWO_STAGE and reused[i] is None]
+    prompts = {
+        i: ANALYZE_CONTEXT_PROMPT.format(format_passages(plan[i]["analysis_passages"]), questions[i]["text"])
+        for i in two_stage
+    }
+    
+    analyses = [""] * len(questions)
+    max_workers = max(1, state.get("max_workers") or DEFAULT_SOLVER_WORKERS)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(propagate(lambda i: call_gemini_with_retry(prompts[i], state["api_key"])), two_stage)
+        for i, analysis in zip(two_stage, results):
+            # A failed analysis is dropped; the question is then solved from its passages alone
+            analyses[i] = "" if analysis.startswith("Error:") else analysis
+    
+    state["question_analyses"] = analyses
+    state["analysis_prompt_tokens"] = sum(estimate_tokens(prompt) for prompt in prompts.values())
+    state["relevance_analysis"] = "\n\n".join(
+        f"**Question {question['number']}**\n\n{analysis}" for question, analysis in zip(questions, analyses) if analysis
+    )
+    return state
+
+# Prompt used for the relevance pass over a question's context passages
+ANALYZE_CONTEXT_PROMPT = """
+    You are an expert at analyzing educational materials for JEE Advanced. Your task is to identify what information in the context,concepts material is relevant to each of the questions.
+    
+    CONTEXT MATERIAL:
+    {}
+    
+    QUESTIONS TEXT:
+    {}
+    
+    For each question you identify in the QUESTIONS TEXT:
+    1. Extract the question number and core topic/concept of the question
+    2. Search the context material for ANY of the following that could be relevant:
+       - Similar solved examples or problems
+       - Explanations of the mathematical/scientific concepts involved
+       - Formulas, theorems, or principles that apply to this question
+       - Methods or techniques mentioned that could help solve this type of problem
+       - Any diagrams, figures, or illustrations related to the topic
+    
+    Provide your analysis in this format:
+    
+    Question [X]: [Core topic/concept]
+    Relevant Information:
+    - [Specific relevant information found in context material and explained step by step]
+    - [Another piece of relevant information and explained step by step]
+    Connection: [Explain how this information helps solve the question step by step]
+    
+    Note: Consider even indirect connections where concepts or techniques might be adapted from one scenario to another which will help to solve the question.
+    """
+
+# Used in place of a relevance analysis when a question is solved in a single fused call
+FUSED_RELEVANCE_NOTE = "No separate relevance analysis was run for this question. Identify the relevant information in the CONTEXT MATERIAL above yourself."
+
+# Prompt used to solve a question with context material
+SOLVE_WITH_CONTEXT_PROMPT = """
+        You are an expert at solving JEE Advanced level problems. Your task is to extract questions from the questions PDF, identify relevant information from the context PDF, and provide detailed solutions.
+        followings that could be relevant information:
+       - Similar solved examples or problems
+       - Explanations of the mathematical/scientific concepts involved
+       - Formulas, theorems, or principles that apply to this question
+       - Methods or techniques mentioned that could help solve this type of problem
+       - Any diagrams, figures, or illustrations related to the topic
+       - Consider even indirect connections where concepts or techniques might be adapted from one scenario to another which will help to solve the question
+
+        CONTEXT MATERIAL:
+        {}
+        
+        QUESTIONS TEXT:
+        {}
+        
+        RELEVANCE ANALYSIS:
+        {}
+        
+        FORMAT INSTRUCTIONS:
+        For each question you identify in the QUESTIONS TEXT:
+        
+        1. First, extract and present the EXACT question as it appears in the original text, preserving all mathematical notation, question numbers, and formatting.
+           Format: "**Question X:** [exact question text as it appears in the PDF]" (replace X with the actual question number)
+        
+        2. MANDATORY: Provide a detailed analysis of how the context material helps with this question:
+           Format: "**Context Analysis:**"
+           - If you found DIRECTLY relevant information (like a similar solved problem), explain: "The context PDF contains a directly relevant example/explanation about [specific concept] which shows how to [approach/technique] and explain how it is relevant step by step."
+           - If you found INDIRECTLY relevant information (like related concepts that can be adapted), explain: "The context PDF discusses [related concept/principle] which can be adapted to this problem because [explanation of connection]. and explain step by step how it can be adapted to this problem step by step."
+           - If you found CONCEPTUAL information (like formulas or principles), explain: "The context PDF provides key formulas/principles for [topic] which apply to this problem, specifically [mention specific formula/principle] and explain this CONCEPTUAL information can be used to solve the problem step by step."
+           - If NO relevant information was found, state: "The context PDF does not contain information applicable to this problem. I will solve it using my standard JEE Advanced knowledge."
+        
+        3. Provide a complete, step-by-step solution with:
+           - Clear identification of the mathematical principles and formulas being applied
+           - Where relevant, explicitly mention how you're applying information from the context PDF
+           - Every step of calculation shown explicitly
+           - Explanation of the reasoning at each step
+           - Format mathematical expressions clearly using proper notation
+        
+        4. End with the final answer clearly marked as "**Answer:** [final result]"
+        
+        5. Separate each question with a horizontal line (---) for clarity
+        
+        IMPORTANT: 
+        - You MUST preserve and present the exact question text as it appears in the PDF before attempting to solve it.
+        - Be specific about how context information is being used in your solution rather than making general claims.
+        - Relevant information doesn't just mean identical problems - it includes related concepts, applicable formulas, similar problem-solving techniques, or explanations that clarify the underlying principles.
+        """
+
+# Prompt used to solve a question without context material
+SOLVE_WITHOUT_CONTEXT_PROMPT = """
+        You are an expert at solving JEE Advanced level problems. Your task is to extract questions from the questions PDF and provide detailed solutions.
+        
+        QUESTIONS TEXT:
+        {}
+        
+        FORMAT INSTRUCTIONS:
+        For each question you identify in the QUESTIONS TEXT:
+        
+        1. First, extract and present the EXACT question as it appears in the original text, preserving all mathematical notation, question numbers, and formatting.
+           Format: "**Question X:** [exact question text as it appears in the PDF]" (replace X with the actual question number)
+        
+        2. MANDATORY: State: "**Analysis:** Solving this question using standard JEE Advanced knowledge on [identify the specific topic/concept]."
+        
+        3. Provide a complete, step-by-step solution with:
+           - Clear identification of the mathematical principles and formulas being applied
+           - Every step of calculation shown explicitly
+           - Explanation of the reasoning at each step
+           - Format mathematical expressions clearly using proper notation
+        
+        4. End with the final answer clearly marked as "**Answer:** [final result]"
+        
+        5. Separate each question with a horizontal line (---) for clarity
+        
+        IMPORTANT: You MUST preserve and present the exact question text as it appears in the PDF before attempting to solve it. Do not paraphrase or summarize the questions.
+        """
+
+# Function to join retrieved passages into a prompt section
+def format_passages(passages):
+    return "\n\n".join(f"[Passage {i + 1}]\n{passage}" for i, passage in enumerate(passages))
+
+# Function to collect the distinct passages retrieved for all questions, in first-seen order
+def unique_passages(passages_per_question):
+    seen = {}
+    for passages in passages_per_question:
+        for passage in passages:
+            seen.setdefault(passage, None)
+    return list(seen)
+
+# Agent: Segment the questions text into individual questions
+def segment_questions(state: GraphState) -> GraphState:
+    """Splits the extracted questions so each question can be solved independently."""
+    # Questions may already have been segmented page by page during OCR
+    if not state.get("questions"):
+        state["questions"] = list(iter_questions(state["questions_document"].iter_pages()))
+    return state
+
+# Agent: Retrieve the most relevant context passages for each question
+def retrieve_context(state: GraphState) -> GraphState:
+    """Looks up the top-k context passages per question in a persisted BM25 index."""
+    context_document = state.get("context_document")
+    if context_document is None:
+        state["context_passages"] = [[] for _ in state["questions"]]
+        state["context_scores"] = [0.0 for _ in state["questions"]]
+        return state
+    
+    index = get_context_index_store().get_or_build_document(context_document)
+    top_k = state.get("top_k_passages") or DEFAULT_TOP_K
+    hits = [index.search(question["text"], top_k) for question in state["questions"]]
+    # Passages go into prompts in document order; the best score, relative to the question's
+    # highest possible score, tells the planner how relevant they are
+    # Only the hits are read back from the document; the index itself holds no passage text
+    state["context_passages"] = [
+        [index.passage(context_document, doc_id) for doc_id, _ in sorted(question_hits)] for question_hits in hits
+    ]
+    state["context_scores"] = [
+        index.relevance(question["text"], question_hits[0][1]) if question_hits else 0.0
+        for question, question_hits in zip(state["questions"], hits)
+    ]
+    return state
+
+# Agent: Decide per question between a direct, fused or two-stage call under the prompt token budget
+def plan_solving(state: GraphState) -> GraphState:
+    questions = state["questions"]
+    state["plan"] = plan_questions(
+        questions,
+        state.get("context_passages") or [[] for _ in questions],
+        state.get("context_scores") or [0.0 for _ in questions],
+        state.get("context_document") is not None,
+        template_tokens=estimate_tokens(SOLVE_WITH_CONTEXT_PROMPT),
+        budget_tokens=state.get("prompt_token_budget") or DEFAULT_PROMPT_TOKEN_BUDGET,
+    )
+    return state
+
+# Agent: Reuse the previous run's answers for questions whose text and context passages did not change
+def reuse_solutions(state: GraphState) -> GraphState:
+    """Fingerprints every planned question and looks the fingerprints up in the paper's saved solutions."""
+    plan = state["plan"]
+    state["fingerprints"] = [
+        question_fingerprint(question["text"], entry["analysis_passages"] + entry["solve_passages"], entry["mode"], GEMINI_MODEL)
+        for question, entry in zip(state["questions"], plan)
+    ]
+    previous = get_solution_store().load(state["paper_key"]) if state.get("paper_key") else {}
+    state["reused_answers"] = [previous.get(fingerprint) for fingerprint in state["fingerprints"]]
+    return state
+
+# Function to route past the relevance pass when no question needs it
+def route_after_plan(state: GraphState) -> str:
+    reused = state.get("reused_answers") or []
+    for i, entry in enumerate(state.get("plan") or []):
+        if entry["mode"] == MODE_TWO_STAGE and (i >= len(reused) or reused[i] is None):
+            return "analyze_context"
+    return "solve_questions"
+
+# Function to build the solve prompt for a single question from its plan entry
+def build_solve_prompt(question, entry, analysis):
+    if entry["mode"] == MODE_DIRECT:
+        return SOLVE_WITHOUT_CONTEXT_PROMPT.format(question["text"])
+    relevance_info = analysis if entry["mode"] == MODE_TWO_STAGE and analysis else FUSED_RELEVANCE_NOTE
+    return SOLVE_WITH_CONTEXT_PROMPT.format(format_passages(entry["solve_passages"]), question["text"], relevance_info)
+
+# Function to solve a single question, used by the solver worker pool
+def solve_single_question(prompt, api_key, on_chunk=None):
+    """Solves one question; when on_chunk is given the answer is streamed and on_chunk receives the text so far."""
+    if on_chunk is None:
+        return call_gemini_with_retry(prompt, api_key)
+    
+    partial = ""
+    try:
+        for chunk in stream_gemini_with_retry(prompt, api_key):
+            partial += chunk
+            on_chunk(partial)
+    except Exception as e:
+        return f"Error: {str(e)}"
+    return partial
+
+# Function to solve questions concurrently, retrying failed questions on their own
+def solve_questions_concurrently(prompts, state, on_progress=None, on_chunk=None):
+    """Fans the per-question prompts out over a bounded thread pool and returns answers in original question order.
+    
+    Workers report back through a queue so that on_progress and on_chunk(index, partial_text) always
+    run on the calling thread, which is what UI reporters rely on.
+    """
+    max_workers = max(1, state.get("max_workers") or DEFAULT_SOLVER_WORKERS)
+    max_rounds = max(1, state.get("max_question_retries") or DEFAULT_QUESTION_RETRIES)
+    answers = [None] * len(prompts)
+    events = queue.Queue()
+    
+    @propagate
+    def run(i):
+        stream_to = (lambda partial: events.put(("chunk", i, partial))) if on_chunk else None
+        try:
+            answer = solve_single_question(prompts[i], state["api_key"], on_chunk=stream_to)
+        except Exception as e:
+            answer = f"Error: {str(e)}"
+        events.put(("done", i, answer))
+    
+    pending = list(range(len(prompts)))
+    completed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for _ in range(max_rounds):
+            for i in pending:
+                pool.submit(run, i)
+            failed = []
+            remaining = len(pending)
+            while remaining:
+                kind, i, text = events.get()
+                if kind == "chunk":
+                    on_chunk(i, text)
+                    continue
+                remaining -= 1
+                answers[i] = text
+                if text.startswith("Error:"):
+                    failed.append(i)
+                else:
+                    completed += 1
+                    if on_progress:
+                        on_progress(completed, len(prompts))
+            pending = sorted(failed)
+            if not pending:
+                break
+    return answers
+
+# Function to compare the prompt tokens actually planned with the previous analyze-then-solve flow
+def build_run_report(state, solve_prompts):
+    """Returns the per-mode plan counts and estimated prompt tokens and calls, with and without planning.
+    
+    The baseline is one relevance pass over every retrieved passage and the whole questions text,
+    followed by one solve call per question carrying its passages and the full relevance analysis.
+    """
+    plan = state["plan"]
+    analyses = state.get("question_analyses") or [""] * len(plan)
+    reused = state.get("reused_answers") or [None] * len(plan)
+    analysis_tokens = state.get("analysis_prompt_tokens") or 0
+    planned_tokens = analysis_tokens + sum(estimate_tokens(prompt) for prompt in solve_prompts)
+    planned_calls = sum(1 for entry, answer in zip(plan, reused) if entry["mode"] == MODE_TWO_STAGE and answer is None) + len(solve_prompts)
+    
+    if state.get("context_document") is not None:
+        passages = unique_passages(state.get("context_passages") or [])
+        full_analysis_tokens = sum(
+            estimate_tokens(analysis) if analysis else DEFAULT_ANALYSIS_TOKENS for analysis in analyses
+        )
+        baseline_tokens = (estimate_tokens(ANALYZE_CONTEXT_PROMPT) + sum(estimate_tokens(page) for page in state["questions_document"].iter_pages())
+                           + sum(estimate_tokens(passage) for passage in passages))
+        template_tokens = estimate_tokens(SOLVE_WITH_CONTEXT_PROMPT)
+        for entry in plan:
+            baseline_tokens += template_tokens + entry["question_tokens"] + entry["context_tokens"] + full_analysis_tokens
+        baseline_calls = 1 + len(plan)
+    else:
+        baseline_tokens = planned_tokens
+        baseline_calls = len(plan)
+    
+    return {
+        "modes": summarize_plan(plan),
+        "planned_prompt_tokens": planned_tokens,
+        "baseline_prompt_tokens": baseline_tokens,
+        "tokens_saved": max(0, baseline_tokens - planned_tokens),
+        "planned_calls": planned_calls,
+        "baseline_calls": baseline_calls,
+        "reused_questions": sum(1 for answer in reused if answer is not None),
+    }
+
+# Agent: Solve Questions with Context
+def solve_questions(state: GraphState) -> GraphState:
+    # Determine if context is available
+    has_context = state.get("context_document") is not None
+    
+    questions = state["questions"]
+    plan = state["plan"]
+    analyses = state.get("question_analyses") or [""] * len(questions)
+    answers = list(state.get("reused_answers") or [None] * len(questions))
+    # Only questions without a reusable answer from the previous run are sent to Gemini
+    pending = [i for i, answer in enumerate(answers) if answer is None]
+    prompts = [build_solve_prompt(questions[i], plan[i], analyses[i]) for i in pending]
+    reused_count = len(questions) - len(pending)
+    
+    reporter = state.get("reporter") or PipelineReporter()
+    stream_output = state.get("stream_output", False)
+    
+    reporter.solve_started(questions, has_context)
+    if reused_count:
+        if stream_output:
+            for i, answer in enumerate(answers):
+                if answer is not None:
+                    reporter.question_chunk(i, answer)
+        reporter.solve_progress(reused_count, len(questions))
+    solved = solve_questions_concurrently(
+        prompts, state,
+        on_progress=lambda done, total: reporter.solve_progress(reused_count + done, len(questions)),
+        on_chunk=(lambda index, text: reporter.question_chunk(pending[index], text)) if stream_output else None,
+    )
+    for i, answer in zip(pending, solved):
+        answers[i] = answer
+    
+    failed = [q["number"] for q, answer in zip(questions, answers) if answer.startswith("Error:")]
+    solved_answers = SOLUTION_SEPARATOR.join(answers)
+    relevance_info = state.get("relevance_analysis", "")
+    
+    state["generated_answers"] = {
+        "Solutions": solved_answers,
+        "Context_Used": has_context,
+        "Relevance_Analysis": relevance_info if has_context else "",
+        "Failed_Questions": failed,
+        "Reused_Questions": [q["number"] for q, answer in zip(questions, state.get("reused_answers") or []) if answer is not None],
+    }
+    state["run_report"] = build_run_report(state, prompts)
+    if state.get("paper_key"):
+        get_solution_store().save(state["paper_key"], questions, state["fingerprints"], answers)
+    reporter.solve_finished(questions, answers, failed)
+    
+    return state
+
+# Function to wrap a graph node so its wall time is recorded in state["stage_seconds"] and in the active trace
+def timed_stage(name, node):
+    def run(state):
+        started = time.perf_counter()
+        with span(f"stage:{name}"):
+            state = node(state)
+        stage_seconds = dict(state.get("stage_seconds") or {})
+        stage_seconds[name] = time.perf_counter() - started
+        state["stage_seconds"] = stage_seconds
+        return state
+    return run
+
+# LangGraph setup
+def build_executor():
+    """Builds and compiles the agent graph."""
+    graph = StateGraph(GraphState)
+    
+    # Add nodes to graph
+    graph.add_node("segment_questions", timed_stage("segment_questions", segment_questions))
+    graph.add_node("retrieve_context", timed_stage("retrieve_context", retrieve_context))
+    graph.add_node("plan_solving", timed_stage("plan_solving", plan_solving))
+    graph.add_node("reuse_solutions", timed_stage("reuse_solutions", reuse_solutions))
+    graph.add_node("analyze_context", timed_stage("analyze_context", analyze_context_relevance))
+    graph.add_node("solve_questions", timed_stage("solve_questions", solve_questions))
+    
+    # Add edges; the relevance pass only runs when the planner chose it for at least one question
+    graph.add_edge("segment_questions", "retrieve_context")
+    graph.add_edge("retrieve_context", "plan_solving")
+    graph.add_edge("plan_solving", "reuse_solutions")
+    graph.add_conditional_edges("reuse_solutions", route_after_plan, {
+        "analyze_context": "analyze_context",
+        "solve_questions": "solve_questions",
+    })
+    graph.add_edge("analyze_context", "solve_questions")
+    graph.set_entry_point("segment_questions")
+    
+    return graph.compile()
+
+def get_executor():
+    """Returns the compiled graph, built once per process instead of on every Streamlit rerun."""
+    global _executor
+    with _singletons_lock:
+        if _executor is None:
+            _executor = build_executor()
+        return _executor
+
+# Function to run the whole pipeline for one paper without any UI
+def run_pipeline(questions_pdf, context_pdf, api_key, mistral_api_key, max_workers=DEFAULT_SOLVER_WORKERS,
+                 top_k_passages=DEFAULT_TOP_K, prompt_token_budget=DEFAULT_PROMPT_TOKEN_BUDGET,
+                 stream_output=False, reporter=None, on_ingest_progress=None, paper_key=None):
+    """Ingests and solves one paper and returns (state, error).
+    
+    A failing questions PDF is an error. A failing or empty context PDF is not: the paper is then
+    solved without context and the problem is reported in state["context_error"]. The run's
+    finished Trace is returned in state["trace"]. With a paper_key, answers are saved under that
+    key and unchanged questions reuse the answers saved by the previous run with the same key.
+    """
+    with traced_run(questions_pdf.name) as trace:
+        state, error = _run_traced_pipeline(questions_pdf, context_pdf, api_key, mistral_api_key, max_workers,
+                                            top_k_passages, prompt_token_budget, stream_output, reporter,
+                                            on_ingest_progress, paper_key)
+    if state is not None:
+        state["trace"] = trace
+    return state, error
+
+def _run_traced_pipeline(questions_pdf, context_pdf, api_key, mistral_api_key, max_workers, top_k_passages,
+                         prompt_token_budget, stream_output, reporter, on_ingest_progress, paper_key):
+    documents = {"Questions PDF": (questions_pdf, True)}
+    if context_pdf:
+        documents["Context PDF"] = (context_pdf, False)
+    ingested = ingest_pdfs_concurrently(documents, mistral_api_key, on_progress=on_ingest_progress)
+    
+    questions_document, questions, questions_error = ingested["Questions PDF"]
+    if questions_error:
+        return None, questions_error
+    if not questions_document.has_text():
+        return None, "Failed to extract text from the questions PDF."
+    
+    context_document, context_error = None, None
+    if context_pdf:
+        context_document, _, context_error = ingested["Context PDF"]
+        if context_error or not context_available(context_document):
+            context_error = context_error or "No readable text found in the context PDF."
+            context_document = None
+    
+    state = get_executor().invoke({
+        "api_key": api_key,
+        "questions_document": questions_document,
+        "context_document": context_document,
+        "questions": questions,
+        "max_workers": max_workers,
+        "top_k_passages": top_k_passages,
+        "prompt_token_budget": prompt_token_budget,
+        "stream_output": stream_output,
+        "max_question_retries": DEFAULT_QUESTION_RETRIES,
+        "generated_answers": {},
+        "reporter": reporter or PipelineReporter(),
+        "paper_key": paper_key
+    })
+    state["context_error"] = context_error
+    return state, None
@@ -0,0 +1,74 @@
+from rate_limiter import estimate_tokens
+
+# How each question is sent to Gemini
+MODE_DIRECT = "direct"        # no usable context: one call with the plain solve prompt, no relevance pass
+MODE_FUSED = "fused"          # small context: one call with the passages inlined, the model does the analysis itself
+MODE_TWO_STAGE = "two_stage"  # large context: a relevance pass over the passages, then a solve call with the analysis
+
+DEFAULT_PROMPT_TOKEN_BUDGET = 12000
+DEFAULT_FUSED_CONTEXT_TOKENS = 3000
+# Room kept in a two-stage solve prompt for the question's relevance analysis
+DEFAULT_ANALYSIS_TOKENS = 800
+# Share of its highest possible BM25 score a question's best passage must reach for the context to be used;
+# questions below it are solved directly, with no passages and no relevance pass
+DEFAULT_MIN_RELEVANCE_SCORE = 0.03
+
+def pack_passages(passages, budget_tokens):
+    """Returns the leading passages that fit in budget_tokens; a passage that does not fit is cut short."""
+    packed = []
+    remaining = budget_tokens
+    for passage in passages:
+        if remaining <= 0:
+            break
+        tokens = estimate_tokens(passage)
+        if tokens > remaining:
+            packed.append(passage[:remaining * 4])
+            break
+        packed.append(passage)
+        remaining -= tokens
+    return packed
+
+def plan_questions(questions, passages_per_question, scores_per_question, has_context, template_tokens,
+                   budget_tokens=DEFAULT_PROMPT_TOKEN_BUDGET,
+                   fused_context_tokens=DEFAULT_FUSED_CONTEXT_TOKENS,
+                   min_relevance_score=DEFAULT_MIN_RELEVANCE_SCORE):
+    """Chooses a mode per question and packs its passages under the prompt token budget.
+
+    Returns one dict per question with the chosen "mode", the estimated "question_tokens" and
+    "context_tokens", the passages for the relevance pass ("analysis_passages", two-stage only)
+    and the passages for the solve prompt ("solve_passages"). A question too long to leave room
+    for any passage under the budget is solved directly.
+    """
+    plan = []
+    for question, passages, score in zip(questions, passages_per_question, scores_per_question):
+        question_tokens = estimate_tokens(question["text"])
+        context_tokens = sum(estimate_tokens(passage) for passage in passages)
+        available = max(0, budget_tokens - template_tokens - question_tokens)
+        entry = {
+            "mode": MODE_DIRECT,
+            "question_tokens": question_tokens,
+            "context_tokens": context_tokens,
+            "analysis_passages": [],
+            "solve_passages": [],
+        }
+        if has_context and passages and score > min_relevance_score:
+            if context_tokens <= min(fused_context_tokens, available):
+                entry["mode"] = MODE_FUSED
+                entry["solve_passages"] = list(passages)
+            else:
+                analysis_passages = pack_passages(passages, available)
+                solve_passages = pack_passages(passages, min(fused_context_tokens, max(0, available - DEFAULT_ANALYSIS_TOKENS)))
+                # A question that leaves no room for passages is solved directly
+                if analysis_passages and solve_passages:
+                    entry["mode"] = MODE_TWO_STAGE
+                    entry["analysis_passages"] = analysis_passages
+                    entry["solve_passages"] = solve_passages
+        plan.append(entry)
+    return plan
+
+def summarize_plan(plan):
+    """Counts questions per mode."""
+    counts = {MODE_DIRECT: 0, MODE_FUSED: 0, MODE_TWO_STAGE: 0}
+    for entry in plan:
+        counts[entry["mode"]] += 1
+    return counts
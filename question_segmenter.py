@@ -0,0 +1,104 @@
+import re
+
+# Matches question headers such as "1.", "Q1.", "Q.1)", "Q.1 A particle", "Question 12:", "**3.**" or "## Q 4" at the
+# start of a line. Only "Q"/"Question" headers may be followed by plain whitespace, since a bare number followed by a
+# space is usually a quantity ("2 kg"), as is a bare number followed by a decimal point ("2.5 m/s").
+# "(2)" is an answer option, not a question.
+QUESTION_HEADER = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t]*)?(?:\*\*)?[ \t]*(?:"
+    r"Q(?:uestion)?[ \t]*\.?[ \t]*(?:No\.?)?[ \t]*(\d{1,3})(?:[ \t]*(?:[.):]|\*\*)|[ \t]+|$)"
+    r"|(\d{1,3})[ \t]*(?:[.):](?!\d)|\*\*))",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Matches subject and section headings such as "# CHEMISTRY", "**Section 2**" or "PART B", after which numbering may restart
+SECTION_HEADING = re.compile(
+    r"^[ \t]*(?:(?:#{1,6}|\*\*)[ \t]*(?i:part|section|paper|physics|chemistry|mathematics|maths)"
+    r"|PART|SECTION|PAPER|PHYSICS|CHEMISTRY|MATHEMATICS|MATHS)\b[^\n]{0,60}$",
+    re.MULTILINE,
+)
+# Without a section heading, a "1" only restarts the numbering after this many questions,
+# so a numbered list inside a short question is not split off
+RESTART_AFTER_QUESTIONS = 3
+
+def _find_question_starts(text, expected=None, run=0, pos=0):
+    """Scans text from pos and returns (starts, expected, run) for the accepted question headers.
+
+    Each start is (offset, number, header_end); a question begins at the section heading right
+    before its header, if any. expected and run (questions since numbering last restarted) are
+    the scan state after the last accepted header, to continue a scan on more text.
+    """
+    events = [(match.start(), match) for match in QUESTION_HEADER.finditer(text, pos)]
+    events += [(match.start(), None) for match in SECTION_HEADING.finditer(text, pos)]
+    starts = []
+    heading = None
+    for offset, match in sorted(events, key=lambda event: (event[0], event[1] is not None)):
+        if match is None:
+            if heading is None:
+                heading = offset
+            continue
+        number = int(match.group(1) or match.group(2))
+        restart = number == 1 and (heading is not None or run >= RESTART_AFTER_QUESTIONS)
+        if expected is None or number == expected or restart:
+            starts.append((offset if heading is None else heading, str(number), match.end()))
+            run = 1 if expected is None or restart else run + 1
+            expected = number + 1
+            heading = None
+    return starts, expected, run
+
+def split_questions(questions_text):
+    """Splits OCR markdown into individual questions, in original order.
+
+    Returns a list of {"number": str, "text": str} dicts. A header is only accepted when its
+    number follows the previous question's number, so numbered steps or sub-parts inside a
+    question are not mistaken for new questions. Numbering may restart at 1 after a subject or
+    section heading, or after a run of questions; a heading is kept with the question after it.
+    Text before the first header (instructions, section titles) is kept with the first question.
+    If no question structure is found the whole text is returned as a single question.
+    """
+    if not questions_text or not questions_text.strip():
+        return []
+
+    starts, _, _ = _find_question_starts(questions_text)
+
+    if len(starts) < 2:
+        return [{"number": starts[0][1] if starts else "1", "text": questions_text.strip()}]
+
+    questions = []
+    for i, (start, number, _) in enumerate(starts):
+        begin = 0 if i == 0 else start
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(questions_text)
+        questions.append({"number": number, "text": questions_text[begin:end].strip()})
+    return questions
+
+def iter_questions(pages):
+    """Incrementally segments an iterable of page markdown, yielding each question once it is complete.
+
+    A question is complete as soon as the next question's header has been seen, so questions on
+    early pages can be handed to the solver while later pages are still being OCR'd. The output
+    matches split_questions on the joined pages.
+    """
+    buffer = ""
+    current_number = None
+    expected, run = None, 0
+    # Offset in the buffer just past the header of the question still being collected
+    scan_from = 0
+    for page in pages:
+        buffer = f"{buffer}\n\n{page}" if buffer else page
+        starts, expected_after, run_after = _find_question_starts(buffer, expected, run, scan_from)
+        if current_number is not None:
+            # The buffer begins with the question still being collected
+            starts = [(0, current_number, scan_from)] + starts
+        if len(starts) < 2:
+            if starts and current_number is None:
+                current_number, scan_from = starts[0][1], starts[0][2]
+                expected, run = expected_after, run_after
+            continue
+        for i in range(len(starts) - 1):
+            begin = 0 if i == 0 else starts[i][0]
+            yield {"number": starts[i][1], "text": buffer[begin:starts[i + 1][0]].strip()}
+        last_start, current_number, header_end = starts[-1]
+        buffer = buffer[last_start:]
+        scan_from = header_end - last_start
+        expected, run = expected_after, run_after
+    if buffer.strip():
+        yield {"number": current_number or "1", "text": buffer.strip()}
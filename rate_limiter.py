@@ -0,0 +1,240 @@
+import asyncio
+import collections
+import hashlib
+import random
+import threading
+import time
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+DEFAULT_DEADLINE_SECONDS = 180.0
+DEFAULT_MAX_ATTEMPTS = 6
+# Rough output allowance reserved per call on top of the prompt; corrected once usage is known
+DEFAULT_OUTPUT_TOKENS_ESTIMATE = 2048
+
+RATE_LIMIT_MARKERS = ("ResourceExhausted", "429", "Too Many Requests", "rate limit", "quota")
+
+class RateLimitTimeout(Exception):
+    """Raised when a call cannot be admitted or retried before its deadline."""
+
+def is_rate_limit_error(error):
+    """Returns True for quota / 429 errors that are worth backing off and retrying."""
+    text = f"{type(error).__name__}: {error}"
+    return any(marker.lower() in text.lower() for marker in RATE_LIMIT_MARKERS)
+
+def estimate_tokens(text):
+    """Cheap token estimate (about four characters per token) used for admission."""
+    return max(1, len(text) // 4)
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Full-jitter exponential backoff: a random delay in [0, min(cap, base * 2 ** attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_second, up to capacity."""
+
+    def __init__(self, capacity, rate_per_second):
+        self.capacity = float(capacity)
+        self.rate_per_second = float(rate_per_second)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def try_acquire(self, amount):
+        """Takes amount tokens and returns 0, or returns the seconds to wait before they are available."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            amount = min(float(amount), self.capacity)
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate_per_second
+
+    def credit(self, amount):
+        """Returns tokens to the bucket (negative amounts debit it, possibly below zero)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def set_rate(self, rate_per_second):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate_per_second = float(rate_per_second)
+
+class AdaptiveRateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter with AIMD adaptation on rate-limit errors.
+
+    Every throttled response halves the admitted rate (multiplicative decrease, down to min_factor
+    of the configured quota); every successful call wins back a small fraction of it (additive
+    increase), so concurrent sessions sharing one API key converge below the real quota instead
+    of hammering it.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 min_factor=0.05, increase_step=0.05, decrease_factor=0.5):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.min_factor = min_factor
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.factor = 1.0
+        self._requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self._tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self._lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "successes": 0,
+            "throttled": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "queue_wait_seconds": 0.0,
+            "throttled_seconds": 0.0,
+        }
+
+    def _apply_factor(self):
+        self._requests.set_rate(self.requests_per_minute * self.factor / 60.0)
+        self._tokens.set_rate(self.tokens_per_minute * self.factor / 60.0)
+
+    def _next_wait(self, tokens):
+        wait = self._requests.try_acquire(1)
+        if wait:
+            return wait
+        wait = self._tokens.try_acquire(tokens)
+        if wait:
+            self._requests.credit(1)
+        return wait
+
+    def _record(self, key, amount=1):
+        with self._lock:
+            self._metrics[key] += amount
+
+    def acquire(self, tokens=1, deadline=None):
+        """Blocks until a request of the given token size is admitted; raises RateLimitTimeout past deadline."""
+        started = time.monotonic()
+        while True:
+            wait = self._next_wait(tokens)
+            if not wait:
+                break
+            if deadline is not None and time.monotonic() + wait > deadline:
+                self._record("timeouts")
+                raise RateLimitTimeout("Timed out waiting for Gemini rate limit capacity.")
+            time.sleep(min(wait, 1.0))
+        self._record("requests")
+        self._record("queue_wait_seconds", time.monotonic() - started)
+
+    async def acquire_async(self, tokens=1, deadline=None):
+        """Non-blocking variant of acquire for use on an asyncio event loop."""
+        started = time.monotonic()
+        while True:
+            wait = self._next_wait(tokens)
+            if not wait:
+                break
+            if deadline is not None and time.monotonic() + wait > deadline:
+                self._record("timeouts")
+                raise RateLimitTimeout("Timed out waiting for Gemini rate limit capacity.")
+            await asyncio.sleep(min(wait, 1.0))
+        self._record("requests")
+        self._record("queue_wait_seconds", time.monotonic() - started)
+
+    def record_success(self, reserved_tokens=0, used_tokens=None):
+        """Additively raises the admitted rate, and settles the token reservation against actual usage."""
+        with self._lock:
+            self._metrics["successes"] += 1
+            self.factor = min(1.0, self.factor + self.increase_step)
+        self._apply_factor()
+        if used_tokens is not None:
+            self._tokens.credit(reserved_tokens - used_tokens)
+
+    def record_throttle(self):
+        """Multiplicatively lowers the admitted rate after a rate-limit error."""
+        with self._lock:
+            self._metrics["throttled"] += 1
+            self.factor = max(self.min_factor, self.factor * self.decrease_factor)
+        self._apply_factor()
+
+    def record_retry(self, delay):
+        with self._lock:
+            self._metrics["retries"] += 1
+            self._metrics["throttled_seconds"] += delay
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["rate_factor"] = self.factor
+        return metrics
+
+# Distinct API keys whose limiters are kept; the least recently used key's limiter is dropped beyond this
+DEFAULT_MAX_LIMITERS = 256
+
+_limiters = collections.OrderedDict()
+_limiters_lock = threading.Lock()
+
+def _put_limiter(key, limiter):
+    _limiters[key] = limiter
+    _limiters.move_to_end(key)
+    while len(_limiters) > DEFAULT_MAX_LIMITERS:
+        _limiters.popitem(last=False)
+
+def get_rate_limiter(api_key, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+    """Returns the process-wide limiter shared by every session using this API key."""
+    key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(requests_per_minute, tokens_per_minute)
+        _put_limiter(key, limiter)
+        return limiter
+
+def install_rate_limiter(api_key, limiter):
+    """Replaces the limiter for this API key, e.g. so each benchmark run starts with a full quota."""
+    with _limiters_lock:
+        _put_limiter(hashlib.sha256(api_key.encode("utf-8")).hexdigest(), limiter)
+
+def run_with_backoff(call, limiter, tokens, deadline_seconds=DEFAULT_DEADLINE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS, on_retry=None):
+    """Runs call() under the limiter, retrying rate-limit errors with jittered exponential backoff.
+
+    Non rate-limit errors are raised immediately. Raises RateLimitTimeout when the deadline or
+    the attempt budget is exhausted. Callers report the outcome with limiter.record_success so the
+    token reservation can be settled against the real usage. on_retry(delay) is called before
+    each backoff sleep.
+    """
+    deadline = time.monotonic() + deadline_seconds
+    for attempt in range(max_attempts):
+        limiter.acquire(tokens, deadline)
+        try:
+            return call()
+        except Exception as e:
+            if not is_rate_limit_error(e):
+                raise
+            limiter.record_throttle()
+            delay = backoff_delay(attempt)
+            if attempt == max_attempts - 1 or time.monotonic() + delay > deadline:
+                raise RateLimitTimeout("API quota exceeded. Please try again later.") from e
+            limiter.record_retry(delay)
+            if on_retry:
+                on_retry(delay)
+            time.sleep(delay)
+    raise RateLimitTimeout("API quota exceeded. Please try again later.")
+
+async def run_with_backoff_async(call, limiter, tokens, deadline_seconds=DEFAULT_DEADLINE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Async variant of run_with_backoff; call is a zero-argument coroutine function."""
+    deadline = time.monotonic() + deadline_seconds
+    for attempt in range(max_attempts):
+        await limiter.acquire_async(tokens, deadline)
+        try:
+            return await call()
+        except Exception as e:
+            if not is_rate_limit_error(e):
+                raise
+            limiter.record_throttle()
+            delay = backoff_delay(attempt)
+            if attempt == max_attempts - 1 or time.monotonic() + delay > deadline:
+                raise RateLimitTimeout("API quota exceeded. Please try again later.") from e
+            limiter.record_retry(delay)
+            await asyncio.sleep(delay)
+    raise RateLimitTimeout("API quota exceeded. Please try again later.")
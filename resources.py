@@ -0,0 +1,69 @@
+import collections
+import hashlib
+import threading
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+from mistralai import Mistral
+
+GEMINI_MODEL = "gemini-2.0-flash"
+# Distinct API keys kept per pool; the least recently used key's client is dropped beyond this
+DEFAULT_MAX_POOLED_KEYS = 32
+
+# Pools live at module level: Streamlit re-executes the app script on every rerun but imports
+# this module only once per process, so clients survive reruns and are shared across sessions.
+_mistral_clients = collections.OrderedDict()
+_gemini_models = collections.OrderedDict()
+_lock = threading.Lock()
+
+def _key_id(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+def _pool_get(pool, key):
+    value = pool.get(key)
+    if value is not None:
+        pool.move_to_end(key)
+    return value
+
+def _pool_put(pool, key, value):
+    # An evicted client is not closed: a running job may still hold it, and it is released once unused
+    pool[key] = value
+    pool.move_to_end(key)
+    while len(pool) > DEFAULT_MAX_POOLED_KEYS:
+        pool.popitem(last=False)
+
+def get_mistral_client(api_key):
+    """Returns a pooled Mistral client for this API key, reusing its HTTP connections."""
+    key = _key_id(api_key)
+    with _lock:
+        client = _pool_get(_mistral_clients, key)
+        if client is None:
+            client = Mistral(api_key=api_key)
+            _pool_put(_mistral_clients, key, client)
+        return client
+
+def get_gemini_model(api_key, model_name=GEMINI_MODEL):
+    """Returns a pooled Gemini model handle bound to this API key."""
+    key = (_key_id(api_key), model_name)
+    with _lock:
+        model = _pool_get(_gemini_models, key)
+        if model is None:
+            # genai.configure is process-global and models pick up the configured client lazily,
+            # so bind the client while the lock is held to keep each handle on its own key.
+            # GenerativeModel._client is private; checked against google-generativeai 0.3 to 0.8,
+            # which requirements.txt pins.
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name)
+            model._client = genai_client.get_default_generative_client()
+            _pool_put(_gemini_models, key, model)
+        return model
+
+def install_mistral_client(api_key, client):
+    """Pools a ready-made client for this API key, so offline stand-ins can replace the real service."""
+    with _lock:
+        _pool_put(_mistral_clients, _key_id(api_key), client)
+
+def install_gemini_model(api_key, model, model_name=GEMINI_MODEL):
+    """Pools a ready-made model handle for this API key, so offline stand-ins can replace the real service."""
+    with _lock:
+        _pool_put(_gemini_models, (_key_id(api_key), model_name), model)
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from llm_cache import normalize_text, is_cacheable_response
+
+DEFAULT_SOLUTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "solutions")
+SOLUTIONS_FILE_NAME = "jee_solutions.txt"
+SOLUTION_SEPARATOR = "\n\n---\n\n"
+
+UNSAFE_NAME_CHARACTERS = re.compile(r"[^A-Za-z0-9._-]+")
+
+def question_fingerprint(question_text, passages, mode, model):
+    """Hashes what a question's answer depends on: its normalized text, the passages it is solved with, the mode and the model.
+
+    The question number is part of the text, so a renumbered question is solved again and its
+    answer never refers to the old number.
+    """
+    digest = hashlib.sha256()
+    for part in (model, mode, normalize_text(question_text)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    for passage in passages:
+        digest.update(hashlib.sha256(normalize_text(passage).encode("utf-8")).digest())
+    return digest.hexdigest()
+
+class SolutionStore:
+    """Keeps the last solved answers of each paper with their fingerprints under data/solutions/<paper>/.
+
+    A paper is identified by a caller-chosen key such as the uploaded file name, so a corrected
+    re-upload of the same paper can reuse the answers of every question that did not change.
+    """
+
+    def __init__(self, solutions_dir=DEFAULT_SOLUTIONS_DIR):
+        self.solutions_dir = solutions_dir
+        self._lock = threading.Lock()
+        os.makedirs(self.solutions_dir, exist_ok=True)
+
+    def paper_dir(self, paper_key):
+        # Readable prefix for browsing data/, hash suffix so distinct keys never collide
+        safe_name = UNSAFE_NAME_CHARACTERS.sub("_", paper_key).strip("._")[:60] or "paper"
+        suffix = hashlib.sha256(paper_key.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.solutions_dir, f"{safe_name}-{suffix}")
+
+    def load(self, paper_key):
+        """Returns {fingerprint: answer} from the paper's previous run, or an empty dict."""
+        path = os.path.join(self.paper_dir(paper_key), "solutions.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                records = json.load(f)["questions"]
+        except (OSError, ValueError, KeyError):
+            return {}
+        return {record["fingerprint"]: record["answer"] for record in records}
+
+    def save(self, paper_key, questions, fingerprints, answers):
+        """Replaces the paper's saved answers and rebuilds its combined jee_solutions.txt.
+
+        Failed answers are left out of the reusable records so they are retried next time.
+        """
+        paper_dir = self.paper_dir(paper_key)
+        records = [
+            {"number": question["number"], "fingerprint": fingerprint, "answer": answer}
+            for question, fingerprint, answer in zip(questions, fingerprints, answers)
+            if is_cacheable_response(answer)
+        ]
+        with self._lock:
+            os.makedirs(paper_dir, exist_ok=True)
+            for name, content in (
+                ("solutions.json", json.dumps({"paper": paper_key, "updated": time.time(), "questions": records}, ensure_ascii=False)),
+                (SOLUTIONS_FILE_NAME, SOLUTION_SEPARATOR.join(answers)),
+            ):
+                path = os.path.join(paper_dir, name)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
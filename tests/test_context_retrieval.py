@@ -0,0 +1,64 @@
+from context_retrieval import BM25Index, ContextIndexStore, chunk_passages, iter_passages, retrieve_passages, tokenize
+from document_store import DocumentStore
+from planner import plan_questions, MODE_DIRECT, MODE_FUSED, MODE_TWO_STAGE
+
+ORGANIC_CHEMISTRY = """Alkenes undergo electrophilic addition reactions. The carbocation intermediate formed in the first step is attacked by the nucleophile. Markovnikov's rule states that the hydrogen adds to the carbon with more hydrogens. 2 moles of HBr react with 1 mole of alkyne.
+
+Esters are formed by the reaction of carboxylic acids with alcohols in the presence of an acid catalyst. Hydrolysis of esters gives back acid and alcohol. Aldehydes and ketones undergo nucleophilic addition.
+
+SN1 reactions proceed via a carbocation; SN2 reactions proceed with inversion of configuration. Tertiary halides favour SN1, primary halides SN2. The rate of reaction depends on 1 or 2 species."""
+
+MECHANICS_QUESTION = ("Q.3 A block of mass 2 kg is placed on a rough inclined plane of angle 30 degrees with coefficient of "
+                      "friction 0.2. Find the acceleration of the block when it is released from rest. (A) 2.3 (B) 3.3 (C) 1.5 (D) 4")
+ORGANIC_QUESTION = ("Q.5 The major product of the reaction of 2-methylpropene with HBr in the absence of peroxide is "
+                    "formed via which carbocation intermediate? (A) primary (B) secondary (C) tertiary (D) none")
+
+def best_relevance(index, question):
+    hits = index.search(question, 3)
+    return index.relevance(question, hits[0][1]) if hits else 0.0
+
+def test_tokenize_drops_bare_numbers():
+    assert tokenize("A mass of 2 kg at 30 degrees, SN2 and H2O") == ["mass", "kg", "degrees", "sn2", "h2o"]
+
+def test_irrelevant_context_is_not_used():
+    index = BM25Index.build(iter_passages([ORGANIC_CHEMISTRY], 60))
+    questions = [{"number": "3", "text": MECHANICS_QUESTION}, {"number": "5", "text": ORGANIC_QUESTION}]
+    scores = [best_relevance(index, question["text"]) for question in questions]
+    plan = plan_questions(questions, [[ORGANIC_CHEMISTRY[:400]]] * 2, scores, has_context=True, template_tokens=100)
+    assert [entry["mode"] for entry in plan] == [MODE_DIRECT, MODE_FUSED]
+    assert plan[0]["solve_passages"] == []
+
+def test_question_over_the_budget_is_solved_directly():
+    questions = [{"number": "5", "text": ORGANIC_QUESTION}]
+    passages = [[ORGANIC_CHEMISTRY] * 10]
+    plan = plan_questions(questions, passages, [0.5], has_context=True, template_tokens=100, budget_tokens=1500)
+    assert plan[0]["mode"] == MODE_TWO_STAGE
+    # No room left at all, then room for the relevance pass but none for the solve prompt's passages
+    for budget_tokens in (120, 700):
+        plan = plan_questions(questions, passages, [0.5], has_context=True, template_tokens=100, budget_tokens=budget_tokens)
+        assert plan[0]["mode"] == MODE_DIRECT
+        assert plan[0]["analysis_passages"] == plan[0]["solve_passages"] == []
+
+def test_passages_are_read_back_from_the_stored_document(tmp_path):
+    pages = [ORGANIC_CHEMISTRY, "Short page.\n\n" + " ".join(f"word{i}" for i in range(50)), "", "Last  page\n  text."]
+    writer = DocumentStore(str(tmp_path)).writer()
+    for page in pages:
+        writer.add(page)
+    document = writer.close()
+    located = list(iter_passages(document.iter_pages(), 20))
+    assert [text for _, text in located] == chunk_passages("\n\n".join(pages), 20)
+    index = BM25Index.build(located)
+    assert [index.passage(document, doc_id) for doc_id in range(len(located))] == [text for _, text in located]
+    assert "carbocation" in retrieve_passages(index, document, "carbocation nucleophile", top_k=1)[0]
+    document.close()
+
+def test_stored_index_is_reloaded_for_the_document(tmp_path):
+    writer = DocumentStore(str(tmp_path / "documents")).writer()
+    writer.add(ORGANIC_CHEMISTRY)
+    document = writer.close()
+    index_dir = str(tmp_path / "index")
+    index = ContextIndexStore(index_dir, passage_words=60).get_or_build_document(document)
+    reloaded = ContextIndexStore(index_dir, passage_words=60).get_or_build_document(document)
+    assert reloaded is not index and reloaded.locations == index.locations
+    assert retrieve_passages(reloaded, document, "esters hydrolysis", top_k=1)[0].startswith("Esters")
+    document.close()
@@ -0,0 +1,82 @@
+import random
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import ocr_pipeline
+from ocr_pipeline import count_pdf_pages, iter_ocr_pages
+
+class FakeError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"Status {status_code}")
+        self.status_code = status_code
+
+class FakeOCR:
+    """OCR stand-in for a document of page_count pages that rejects out-of-range pages like the real service.
+
+    errors maps a page index to the statuses returned, in turn, by requests that include that page.
+    """
+
+    def __init__(self, page_count, errors=None, max_delay=0.0):
+        self.page_count = page_count
+        self.errors = {index: list(statuses) for index, statuses in (errors or {}).items()}
+        self.max_delay = max_delay
+        self.requests = []
+        self._lock = threading.Lock()
+        self.ocr = SimpleNamespace(process=self.process)
+
+    def process(self, model, document, include_image_base64=False, pages=None):
+        indexes = list(range(self.page_count)) if pages is None else list(pages)
+        with self._lock:
+            self.requests.append(indexes)
+            for index in indexes:
+                if self.errors.get(index):
+                    raise FakeError(self.errors[index].pop(0))
+        if any(index >= self.page_count for index in indexes):
+            raise FakeError(422)
+        # Not time.sleep, which the tests replace to skip retry backoff
+        threading.Event().wait(random.uniform(0, self.max_delay))
+        return SimpleNamespace(pages=[SimpleNamespace(index=index, markdown=f"page {index}") for index in indexes])
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ocr_pipeline.time, "sleep", lambda seconds: None)
+
+def ocr(client, page_count, **kwargs):
+    return list(iter_ocr_pages(client, "url", page_count, requests_per_second=0, **kwargs))
+
+def test_pages_come_back_in_order_while_ranges_finish_out_of_order():
+    client = FakeOCR(37, max_delay=0.01)
+    pages = ocr(client, 37, pages_per_range=3, max_concurrency=6)
+    assert pages == [(index, f"page {index}") for index in range(37)]
+
+def test_overestimated_page_count_ends_at_the_real_end():
+    client = FakeOCR(10)
+    pages = ocr(client, 120)
+    assert [index for index, _ in pages] == list(range(10))
+    # Ranges past the end found are skipped rather than each probed
+    assert len(client.requests) < 10
+
+def test_rejected_first_page_is_an_error():
+    with pytest.raises(RuntimeError):
+        ocr(FakeOCR(0), 5)
+
+def test_auth_error_after_the_first_range_is_raised_not_taken_as_the_end():
+    client = FakeOCR(20, errors={12: [403] * 10})
+    with pytest.raises(RuntimeError, match="403"):
+        ocr(client, 20, max_concurrency=1)
+
+def test_timeouts_are_retried():
+    client = FakeOCR(20, errors={12: [408, 500]})
+    assert [index for index, _ in ocr(client, 20)] == list(range(20))
+
+def test_unknown_page_count_is_retried():
+    client = FakeOCR(4, errors={0: [503]})
+    assert [index for index, _ in ocr(client, None)] == [0, 1, 2, 3]
+
+def test_page_count_ignores_outline_counts():
+    pdf = (b"1 0 obj << /Type /Pages /Kids [] /Count 10 >> endobj\n"
+           b"2 0 obj << /Type /Outlines /First 3 0 R /Count 120 >> endobj\n"
+           b"3 0 obj << /Title (Chapter 1) /Count 5 >> endobj\n")
+    assert count_pdf_pages(pdf) == 10
@@ -0,0 +1,79 @@
+from question_segmenter import split_questions, iter_questions
+
+def numbers(questions):
+    return [question["number"] for question in questions]
+
+def pages_of(text, lines_per_page):
+    """Cuts text into "pages" of a few lines to exercise the incremental segmenter across page breaks."""
+    lines = text.split("\n")
+    return ["\n".join(lines[i:i + lines_per_page]) for i in range(0, len(lines), lines_per_page)]
+
+def assert_incremental_matches(text):
+    for lines_per_page in (1, 2, 3, 5):
+        pages = pages_of(text, lines_per_page)
+        assert list(iter_questions(pages)) == split_questions("\n\n".join(pages))
+
+def test_dotted_headers():
+    text = "Instructions: answer all.\n\n1. First question.\n2. Second question.\n3. Third question."
+    questions = split_questions(text)
+    assert numbers(questions) == ["1", "2", "3"]
+    assert questions[0]["text"].startswith("Instructions")
+    assert_incremental_matches(text)
+
+def test_official_q_dot_header_followed_by_whitespace():
+    text = "Q.1 A particle moves in a circle.\n\nQ.2 A block of mass 2 kg rests on a plane.\n\nQ.3\nFind the limit."
+    questions = split_questions(text)
+    assert numbers(questions) == ["1", "2", "3"]
+    assert questions[1]["text"] == "Q.2 A block of mass 2 kg rests on a plane."
+    assert_incremental_matches(text)
+
+def test_bare_number_followed_by_space_is_not_a_header():
+    text = "1. Two masses are given:\n2 kg and 3 kg are joined.\n2. Next question."
+    assert numbers(split_questions(text)) == ["1", "2"]
+
+def test_decimal_at_line_start_is_not_a_header():
+    text = "1. A ball is thrown with speed\n2.5 m/s from the top of a tower.\n2. Next question here.\n3. Third."
+    questions = split_questions(text)
+    assert numbers(questions) == ["1", "2", "3"]
+    assert questions[0]["text"] == "1. A ball is thrown with speed\n2.5 m/s from the top of a tower."
+    assert_incremental_matches(text)
+
+def test_numbering_restarts_after_subject_headings():
+    text = ("# PHYSICS\n1. P one.\n2. P two.\n3. P three.\n"
+            "# CHEMISTRY\n1. C one.\n2. C two.\n3. C three.\n"
+            "# MATHEMATICS\n1. M one.\n2. M two.")
+    questions = split_questions(text)
+    assert numbers(questions) == ["1", "2", "3", "1", "2", "3", "1", "2"]
+    # A heading starts the question after it, not the end of the one before
+    assert questions[2]["text"] == "3. P three."
+    assert questions[3]["text"] == "# CHEMISTRY\n1. C one."
+    assert_incremental_matches(text)
+
+def test_numbering_restarts_without_heading_after_a_run():
+    text = "1. A.\n2. B.\n3. C.\n1. D.\n2. E."
+    assert numbers(split_questions(text)) == ["1", "2", "3", "1", "2"]
+    assert_incremental_matches(text)
+
+def test_numbered_steps_in_first_questions_do_not_restart():
+    text = "1. Consider the steps:\n1. heat\n2. Second question."
+    assert numbers(split_questions(text)) == ["1", "2"]
+
+def test_numbering_may_continue_across_sections():
+    text = "PHYSICS\nQ.1 One.\nQ.2 Two.\nCHEMISTRY\nQ.3 Three.\nQ.4 Four."
+    questions = split_questions(text)
+    assert numbers(questions) == ["1", "2", "3", "4"]
+    assert questions[2]["text"] == "CHEMISTRY\nQ.3 Three."
+    assert_incremental_matches(text)
+
+def test_answer_options_are_not_questions():
+    text = ("1. Which is correct?\n(1) alpha\n(2) beta\n(3) gamma\n(4) delta\n"
+            "2. Another question?\n(1) one\n(2) two\n(3) three\n(4) four")
+    questions = split_questions(text)
+    assert numbers(questions) == ["1", "2"]
+    assert "(4) delta" in questions[0]["text"]
+    assert_incremental_matches(text)
+
+def test_unstructured_text_is_one_question():
+    assert split_questions("Just some text without headers.") == [{"number": "1", "text": "Just some text without headers."}]
+    assert split_questions("  \n ") == []
+    assert list(iter_questions([])) == []
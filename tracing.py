@@ -0,0 +1,180 @@
+"""Per-run tracing: wall time, sizes, token counts, retries and cache hits for each pipeline stage.
+
+A run starts a Trace with start_trace(); code anywhere below it records into the active trace with
+span() and add_counter(), and does nothing when no trace is active. The active trace lives in a
+context variable, so work handed to thread pools must be wrapped with propagate() to stay in it.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_current_trace = contextvars.ContextVar("jee_trace", default=None)
+
+# Span attributes that add up across spans and runs; others, such as the page an OCR range found the
+# end of the document at or the time to a stream's first chunk, stay in the spans only
+SUMMED_ATTRIBUTES = (
+    "bytes", "pages", "markdown_chars", "prompt_tokens", "response_tokens",
+    "cache_hit", "retries", "backoff_seconds", "skipped",
+)
+
+class Trace:
+    """Spans and counters recorded during one pipeline run."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = []
+        self.counters = {}
+        self.duration = None
+
+    def _record_span(self, name, started, duration, attrs):
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "start": started - self._origin,
+                "duration": duration,
+                "thread": threading.get_ident(),
+                "attrs": attrs,
+            })
+
+    def add(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """Aggregates spans by name: call count, total and max seconds, and sums of SUMMED_ATTRIBUTES."""
+        stages = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span_record in spans:
+            stage = stages.setdefault(span_record["name"], {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+            stage["calls"] += 1
+            stage["seconds"] += span_record["duration"]
+            stage["max_seconds"] = max(stage["max_seconds"], span_record["duration"])
+            for key, value in span_record["attrs"].items():
+                if key not in SUMMED_ATTRIBUTES:
+                    continue
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    stage[key] = stage.get(key, 0) + value
+        return stages
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "started": self.started,
+                "duration": self.duration,
+                "counters": dict(self.counters),
+                "spans": list(self.spans),
+            }
+
+    def to_chrome_trace(self):
+        """Returns the run in Chrome trace event format (load it in chrome://tracing or Perfetto)."""
+        with self._lock:
+            spans = list(self.spans)
+        events = [{
+            "name": span_record["name"],
+            "ph": "X",
+            "ts": span_record["start"] * 1e6,
+            "dur": span_record["duration"] * 1e6,
+            "pid": os.getpid(),
+            "tid": span_record["thread"],
+            "args": span_record["attrs"],
+        } for span_record in spans]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"run": self.name}}, default=str)
+
+    def to_prometheus(self):
+        """Returns the run's stage timings and counters in the Prometheus text exposition format."""
+        return _format_prometheus(self.summary(), dict(self.counters))
+
+def _metric_name(name):
+    return "jee_" + "".join(c if c.isalnum() else "_" for c in name).lower()
+
+def _format_prometheus(stages, counters):
+    lines = [
+        "# HELP jee_stage_seconds Wall time spent in each pipeline stage.",
+        "# TYPE jee_stage_seconds summary",
+    ]
+    for name, stage in sorted(stages.items()):
+        lines.append(f'jee_stage_seconds_sum{{stage="{name}"}} {stage["seconds"]:.6f}')
+        lines.append(f'jee_stage_seconds_count{{stage="{name}"}} {stage["calls"]}')
+    for name, stage in sorted(stages.items()):
+        for key, value in sorted(stage.items()):
+            if key not in ("calls", "seconds", "max_seconds"):
+                lines.append(f'{_metric_name(key)}_total{{stage="{name}"}} {value}')
+    for name, value in sorted(counters.items()):
+        lines.append(f"{_metric_name(name)}_total {value}")
+    return "\n".join(lines) + "\n"
+
+# Process-wide totals across finished runs, for a long-lived server's metrics endpoint
+_totals_lock = threading.Lock()
+_total_stages = {}
+_total_counters = {}
+
+def start_trace(name):
+    """Starts a trace and makes it the active one in the current context; returns (trace, token)."""
+    trace = Trace(name)
+    return trace, _current_trace.set(trace)
+
+def finish_trace(trace, token=None):
+    """Stops a trace, adds it to the process-wide totals and restores the previously active trace."""
+    trace.duration = time.perf_counter() - trace._origin
+    if token is not None:
+        _current_trace.reset(token)
+    with _totals_lock:
+        for name, stage in trace.summary().items():
+            total = _total_stages.setdefault(name, {})
+            for key, value in stage.items():
+                total[key] = max(total.get(key, 0), value) if key == "max_seconds" else total.get(key, 0) + value
+        for name, value in trace.counters.items():
+            _total_counters[name] = _total_counters.get(name, 0) + value
+    return trace
+
+@contextmanager
+def traced_run(name):
+    """Runs the enclosed block under a new active trace, which is finished on exit and yielded."""
+    trace, token = start_trace(name)
+    try:
+        yield trace
+    finally:
+        finish_trace(trace, token)
+
+def export_prometheus():
+    """Returns process-wide totals over every finished run in the Prometheus text format."""
+    with _totals_lock:
+        return _format_prometheus({name: dict(stage) for name, stage in _total_stages.items()}, dict(_total_counters))
+
+@contextmanager
+def span(name, **attrs):
+    """Times the enclosed block in the active trace; attributes can be added to the yielded dict."""
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        if trace is not None:
+            trace._record_span(name, started, time.perf_counter() - started, attrs)
+
+def add_counter(name, value=1):
+    """Increments a run-level counter in the active trace, if any."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, value)
+
+def propagate(func):
+    """Wraps func so it records into the caller's active trace when it runs on another thread."""
+    trace = _current_trace.get()
+    def run(*args, **kwargs):
+        token = _current_trace.set(trace)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_trace.reset(token)
+    return run